@@ -7,14 +7,92 @@ from typing import Literal, List
 from langchain_google_vertexai import ChatVertexAI
 from dotenv import load_dotenv
 from typing import TypedDict
+from langchain_core.callbacks import BaseCallbackHandler
 import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.tracing import metrics, timed
+from utils.model_tiers import TierPolicy
 
 
 load_dotenv()
 
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "credentials/vertexai.json"
 
-llm = ChatVertexAI(model="gemini-1.5-pro")
+
+# Routing and tool-argument extraction run on the fast tier; nodes whose reply is
+# the answer the user reads run on the large tier. Override with MODEL_TIER_<NODE>.
+tier_policy = TierPolicy(
+    models={
+        "fast": os.getenv("AGENT_MODEL_FAST", "gemini-1.5-flash"),
+        "large": os.getenv("AGENT_MODEL_LARGE", "gemini-1.5-pro"),
+    },
+    defaults={
+        "supervisor": "fast",
+        "chart": "fast",
+        "extract_news": "fast",
+        "sentiment_analysis": "fast",
+        "finance_info": "large",
+        "search": "large",
+    },
+)
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Counts prompt/completion tokens of every chat model call into llm_tokens_total.
+
+    With a tier and component it also reports latency and tokens to tier_policy.
+    """
+
+    def __init__(self, tier: str = None, component: str = None):
+        self.tier = tier
+        self.component = component
+        self._starts = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs):
+        start = self._starts.pop(run_id, None)
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if not usage:
+                    continue
+                model = (message.response_metadata or {}).get("model_name", "vertexai")
+                metrics.inc("llm_tokens_total", usage.get("input_tokens", 0),
+                            help="Tokens sent to and received from the LLM.", model=model, kind="prompt")
+                metrics.inc("llm_tokens_total", usage.get("output_tokens", 0), model=model, kind="completion")
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        if self.tier and start is not None:
+            tier_policy.record(self.component, self.tier, time.perf_counter() - start, prompt_tokens, completion_tokens)
+
+    def on_llm_error(self, error, *, run_id=None, **kwargs):
+        self._starts.pop(run_id, None)
+
+
+def get_llm(component: str, tier: str = None) -> ChatVertexAI:
+    """Chat model for a graph node, on the tier tier_policy assigns to it unless one is given."""
+    if tier is None:
+        tier, model = tier_policy.model_for(component)
+    else:
+        model = tier_policy.models[tier]
+    return ChatVertexAI(model=model, callbacks=[TokenUsageCallback(tier, component)])
+
+
+llm = ChatVertexAI(model=tier_policy.models["large"], callbacks=[TokenUsageCallback()])
+
+# Gemini can return several function calls in one turn; ToolNode then runs them
+# concurrently (see utils.tool_pool), so ask the workers to batch independent calls.
+TOOL_BATCH_PROMPT = (
+    "When you need several independent tool calls (for example one chart per chart type,"
+    " or one extraction per URL), request all of them in the same turn instead of one"
+    " per turn. Only wait for a result when the next call depends on it."
+)
 
 class State(MessagesState):
     next: str
@@ -34,10 +112,19 @@ class Router(TypedDict):
     """Worker to route to next. If no workers needed, route to FINISH."""
     next: Literal[*options]
 
+supervisor_llm = get_llm("supervisor")
+supervisor_escalation_llm = get_llm("supervisor", tier="large")
+
+@timed("node.supervisor")
 def supervisor_node(state: State) -> Command[Literal[*workers, "__end__"]]:
     messages = [{"role":"system", "content":system_promp},] + state["messages"]
 
-    response = llm.with_structured_output(Router).invoke(messages)
+    result = supervisor_llm.with_structured_output(Router, include_raw=True).invoke(messages)
+    response = result["parsed"]
+    # The fast model occasionally returns no or malformed route; ask the large one.
+    if not response or response.get("next") not in options:
+        tier_policy.escalate("supervisor", "fast")
+        response = supervisor_escalation_llm.with_structured_output(Router).invoke(messages)
     goto = response["next"]
     if goto == "FINISH":
         goto = END
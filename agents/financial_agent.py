@@ -9,16 +9,23 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from agents.agent_utilities import State
-from agents.agent_utilities import llm 
+from agents.agent_utilities import get_llm, TOOL_BATCH_PROMPT
+from utils.tracing import timed
+from utils.tool_pool import bounded_tools, tool_config
 from tools.finance_tools import *
 
 
-chart_agent = create_react_agent(llm, tools=[plot_volume_chart,plot_candlestick, plot_monthly_returns_heatmap, plot_shareholders_piechart,plot_volume_and_closed_price,plot_line_chart])
+chart_agent = create_react_agent(
+    get_llm("chart"),
+    tools=bounded_tools([plot_volume_chart,plot_candlestick, plot_monthly_returns_heatmap, plot_shareholders_piechart,plot_volume_and_closed_price,plot_line_chart]),
+    prompt=TOOL_BATCH_PROMPT,
+)
 
 
+@timed("node.chart")
 def chart_agent_node(state: State) -> Command[Literal["supervisor"]]:
     """Invoke the chart agent to draw financial data and return the result."""
-    result = chart_agent.invoke(state)
+    result = chart_agent.invoke(state, config=tool_config())
     return Command(
         update={
             "messages": [
@@ -28,11 +35,16 @@ def chart_agent_node(state: State) -> Command[Literal["supervisor"]]:
         goto="supervisor",
     )
 
-finance_agent = create_react_agent(llm, tools=[get_internal_reports, get_stock_data])
+finance_agent = create_react_agent(
+    get_llm("finance_info"),
+    tools=bounded_tools([get_internal_reports, get_stock_data]),
+    prompt=TOOL_BATCH_PROMPT,
+)
 
+@timed("node.finance_info")
 def finance_info_agent_node(state: State) -> Command[Literal["supervisor"]]:
     """Invoke the finance info agent and return the result."""
-    result = finance_agent.invoke(state)
+    result = finance_agent.invoke(state, config=tool_config())
     return Command(
         update={
             "messages": [
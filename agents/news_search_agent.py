@@ -6,7 +6,9 @@ from tools.web_tools import tavily_tool, extract_info_tool
 from langgraph.graph import START, END
 from agents.agent_utilities import State
 from langgraph.prebuilt import create_react_agent
-from agents.agent_utilities import llm
+from agents.agent_utilities import get_llm, TOOL_BATCH_PROMPT
+from utils.tracing import timed
+from utils.tool_pool import bounded_tools, tool_config
 from typing import Literal
 from dotenv import load_dotenv
 import os
@@ -17,23 +19,38 @@ HF_API_KEY = os.getenv("HF_TOKEN")
 
 HEADERS = {"Authorization": f"Bearer {HF_API_KEY}"}
 
-search_agent = create_react_agent(llm, tools=[tavily_tool, semantic_search_news_db])
+# Search calls are quick or useless; page extraction may go through Selenium.
+TOOL_TIMEOUTS = {"tavily_tool": 20, "semantic_search_news_db": 20, "extract_info_tool": 45}
 
-extract_news_agent = create_react_agent(llm, tools=[extract_info_tool])
+search_agent = create_react_agent(
+    get_llm("search"),
+    tools=bounded_tools([tavily_tool, semantic_search_news_db], TOOL_TIMEOUTS),
+    prompt=TOOL_BATCH_PROMPT,
+)
 
+extract_news_agent = create_react_agent(
+    get_llm("extract_news"),
+    tools=bounded_tools([extract_info_tool], TOOL_TIMEOUTS),
+    prompt=TOOL_BATCH_PROMPT,
+)
 
+sentiment_llm = get_llm("sentiment_analysis")
+
+
+@timed("node.search")
 def search_agent_node(state: State) -> Command[Literal["supervisor"]]:
     """Agent tìm kiếm bài viết tài chính"""
-    result = search_agent.invoke(state)
+    result = search_agent.invoke(state, config=tool_config())
     return Command(
         update={"messages": [HumanMessage(content=result["messages"][-1].content, name="search")]},
         goto="supervisor",
     )
 
 
+@timed("node.extract_news")
 def extract_news_agent_node(state: State) -> Command[Literal["sentiment_analysis"]]:
     """Agent trích xuất nội dung bài viết"""
-    result = extract_news_agent.invoke(state)
+    result = extract_news_agent.invoke(state, config=tool_config())
     return Command(
         update={"messages": [HumanMessage(content=result["messages"][-1].content, name="extract_news")]},
         goto="sentiment_analysis",
@@ -60,6 +77,7 @@ def analyze_sentiment_huggingface(text: str) -> str:
     return mapping.get(sentiment, "trung bình")
 
 
+@timed("node.sentiment_analysis")
 def sentiment_analysis_agent_node(state: State) -> Command[Literal["supervisor"]]:
     """Agent phân tích cảm xúc bài viết tài chính"""
     last_message = state["messages"][-1].content  
@@ -73,8 +91,8 @@ def sentiment_analysis_agent_node(state: State) -> Command[Literal["supervisor"]
         
         Nội dung: {last_message}
         """
-        result = llm.invoke([HumanMessage(content=prompt)])
-        sentiment = result["messages"][-1].content.strip().lower()
+        result = sentiment_llm.invoke([HumanMessage(content=prompt)])
+        sentiment = result.content.strip().lower()
 
     return Command(
         update={"messages": [HumanMessage(content=sentiment, name="sentiment_analysis")]},
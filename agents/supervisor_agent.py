@@ -1,6 +1,5 @@
 from agent_utilities import supervisor_node, State
 from langgraph.graph import StateGraph, START
-from agent_utilities import llm 
 from financial_agent import *
 from news_search_agent import *
 
@@ -1,37 +1,86 @@
 from dotenv import load_dotenv
 from fastapi import FastAPI
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from starlette.background import BackgroundTask
 from typing import Annotated
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from langchain_community.tools.tavily_search import TavilySearchResults
 import os
+import sys
 import time
+from urllib.parse import urlparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from llm import VertexLLM
 from prompt import SYSTEM_PROMPT, INSTRUCTION_PROMPT
+from history import HistoryManager, CHARS_PER_TOKEN, estimate_tokens, message_tokens
 import requests
-from bs4 import BeautifulSoup
 from pydantic import BaseModel
 import typing as t
 import logging
 import asyncio
-from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import contextvars
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from utils.singleflight import get_flight, all_stats
+from utils.html_extract import extract_text
+from utils.retrieval import Deadline, RetrievalPlanner
+from utils.tracing import span, record_stage, start_trace, recent_spans, render_prometheus, chrome_trace
+from utils.lazy import Lazy, warm_up
+from utils.admission import AdmissionController, AdmissionMiddleware, StageBudgets, Rejected, STAGE_LIMITS
+from utils.model_tiers import TierPolicy, looks_unsure
 logger = logging.getLogger(__name__)
 load_dotenv()
 
 app = FastAPI()
-llm = VertexLLM()
+llm = Lazy(VertexLLM, "llm")
+
+admission = AdmissionController()
+stage_budgets = StageBudgets()
+app.add_middleware(AdmissionMiddleware, controller=admission, paths=["/generate", "/stream_generate"])
 
 
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", str(os.cpu_count() or 1)))
+SELENIUM_PAGE_LOAD_TIMEOUT = float(os.getenv("SELENIUM_PAGE_LOAD_TIMEOUT", "20"))
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+
+# MODEL is the large model used for synthesis; MODEL_FAST (default: MODEL) serves simple questions.
+tier_policy = TierPolicy(
+    models={"fast": os.getenv("MODEL_FAST") or os.getenv("MODEL"), "large": os.getenv("MODEL")},
+    defaults={"generate": "auto", "stream_generate": "auto", "history_summary": "fast"},
+)
+
+def _worker_pid(_):
+    return os.getpid()
+
+def _start_fetch_pool():
+    pool = ProcessPoolExecutor(max_workers=FETCH_WORKERS)
+    # Workers are spawned on demand; start them all now so the first requests don't pay for it.
+    list(pool.map(_worker_pid, range(FETCH_WORKERS)))
+    return pool
+
+executor = Lazy(_start_fetch_pool, "fetch_pool")
+# Blocking LLM calls get their own threads, one per "llm" stage slot, so a slot holder
+# never waits behind searches or database calls in the default executor.
+llm_executor = ThreadPoolExecutor(STAGE_LIMITS["llm"], thread_name_prefix="llm")
+# One per pool worker: a fetch holding a slot is running, not queued behind other fetches.
+fetch_slots = asyncio.Semaphore(FETCH_WORKERS)
 
-executor = ProcessPoolExecutor()
+def _make_tavily_search():
+    from langchain_community.tools.tavily_search import TavilySearchResults
+    return TavilySearchResults(max_results=8)
+
+tavily_search = Lazy(_make_tavily_search, "tavily_search")
+
+search_flight = get_flight("tavily")
+fetch_flight = get_flight("web_content")
+
+planner = RetrievalPlanner()
 
 class Request(BaseModel):
     messages: t.List[t.Dict]
 
-def tavily_tool(query):
-    response = TavilySearchResults(max_results=8).invoke(query)  
+def _tavily_search(query):
+    response = tavily_search.get().invoke(query)
     
     if not isinstance(response, list):
         return []
@@ -43,54 +92,68 @@ def tavily_tool(query):
 
         if isinstance(item, dict) and "score" in item and "url" in item:
             if item["score"] > 0.5:
-                lst.append(item["url"])
+                lst.append({"url": item["url"], "score": item["score"]})
 
     return lst
 
+def tavily_tool(query):
+    """Searches Tavily, sharing one upstream call between concurrent identical queries."""
+    return search_flight.do(query, _tavily_search, query)
+
+async def async_tavily_tool(query):
+    """Async tavily_tool: runs the search in the default thread pool, apart from the LLM calls."""
+    loop = asyncio.get_running_loop()
+    return await search_flight.ado(query, loop.run_in_executor, None, _tavily_search, query)
+
 def clean_html(html_content):
-    """Removes scripts, styles, and extracts visible text."""
-    soup = BeautifulSoup(html_content, "html.parser")
-    for script_or_style in soup(["script", "style"]):
-        script_or_style.decompose()
-    return soup.get_text(separator=" ", strip=True)
+    """Extracts the main article text, without scripts, styles or page chrome."""
+    return extract_text(html_content)
 
 def get_web_content(url: str) -> str:
+    domain = urlparse(url).netloc
     try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        return soup.get_text()
+        with span("fetch", domain=domain) as attrs:
+            response = requests.get(url, timeout=5)
+            response.raise_for_status()
+            attrs["bytes"] = len(response.content)
+        with span("parse", domain=domain) as attrs:
+            text = clean_html(response.text)
+            attrs["chars"] = len(text)
+            return text
     except Exception as e:
         return f"Error fetching content: {e}"
     return f"Mock content from {url}"
 
 def get_facebook_content(url, headless=True):
     """Extracts content from Facebook using Selenium."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
     options = Options()
     options.add_argument("--headless")
     options.add_argument("--disable-blink-features=AutomationControlled")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage")
 
+    driver = None
     try:
         driver = webdriver.Chrome(options=options)
+        # Bounds the call itself: a hung page would otherwise hold its worker indefinitely.
+        driver.set_page_load_timeout(SELENIUM_PAGE_LOAD_TIMEOUT)
         driver.get(url)
         time.sleep(5)
 
         page_source = driver.page_source
-        driver.quit()
-
-        soup = BeautifulSoup(page_source, "html.parser")
-        texts = [div.get_text(separator=" ", strip=True) for div in soup.find_all('div')]
-        return " ".join(texts)
+        return extract_text(page_source, main_content=False)
     except Exception as e:
         return f"Failed to fetch Facebook content: {e}"
+    finally:
+        if driver is not None:
+            driver.quit()
     
 def extract_info_tool(url: Annotated[str, "The URL to extract information from."]):
     """Extracts text content from a given URL."""
-    if "facebook.com" in url or "m.facebook.com" in url:
-        return get_facebook_content(url)
-    return get_web_content(url)
+    return fetch_flight.do(url, extract_info_sync, url)
 
 async def async_extract_info_tool(url: Annotated[str, "The URL to extract information from."]):
     """Extracts text content from a given URL."""
@@ -98,44 +161,180 @@ async def async_extract_info_tool(url: Annotated[str, "The URL to extract inform
         return get_facebook_content(url)
     return get_web_content(url)
 
+def is_facebook_url(url: str) -> bool:
+    return "facebook.com" in url or "m.facebook.com" in url
+
 def extract_info_sync(url: str) -> str:
     """Hàm đồng bộ chọn phương thức phù hợp để trích xuất nội dung."""
-    if "facebook.com" in url or "m.facebook.com" in url:
+    if is_facebook_url(url):
         return get_facebook_content(url)
     return get_web_content(url)
 
 
-async def async_extract_info_tool_multiprocess(url: str):
+def _extract_in_worker(url: str) -> dict:
+    """Runs extract_info_sync in a pool worker and ships its spans back to the parent."""
+    # The parent records these spans under the request's trace; don't export them twice.
+    trace_id = start_trace(export=False)
+    content = extract_info_sync(url)
+    return {"content": content, "spans": recent_spans(trace_id)}
+
+async def _extract_in_pool(url: str, deadline: Deadline) -> dict:
+    """Runs _extract_in_worker once a pool worker is free; the deadline starts there."""
+    await fetch_slots.acquire()
+    future = asyncio.get_running_loop().run_in_executor(executor.get(), _extract_in_worker, url)
+    # A timed-out extraction keeps its worker until it returns, so it keeps its slot too.
+    future.add_done_callback(lambda _: fetch_slots.release())
+    return await asyncio.wait_for(asyncio.shield(future), deadline.start())
+
+async def async_extract_info_tool_multiprocess(url: str, deadline: t.Optional[Deadline] = None):
     """Chạy extract_info_sync trong một process khác."""
+    deadline = deadline or Deadline(planner.max_timeout)
+    # Each Selenium fetch holds a headless browser, so they get their own budget.
+    budget = stage_budgets.limit("selenium") if is_facebook_url(url) else contextlib.nullcontext()
+    with span("fetch_url", domain=urlparse(url).netloc):
+        async with budget:
+            result = await fetch_flight.ado(url, _extract_in_pool, url, deadline)
+    # Only the first of the callers sharing this result records the worker's stages.
+    for child in result.pop("spans", []):
+        record_stage(child["name"], child["duration"], start=child["start"], error=child.get("error"), **child["attrs"])
+    return result["content"]
+
+async def retrieve_contents(query):
+    """Searches, then fetches only as many of the best pages as the context needs."""
+    with span("search"):
+        candidates = await async_tavily_tool(query)
+    with span("retrieve", candidates=len(candidates)) as attrs:
+        contents = await planner.gather(candidates, async_extract_info_tool_multiprocess)
+        attrs["pages"] = len(contents)
+    return contents
+
+def summarize_history(prompt):
+    tier, model = tier_policy.model_for("history_summary")
+    return llm.get().generate([{"role": "user", "content": prompt}], model)
+
+# Summaries are optional work: they use a spare LLM slot or wait for a later turn.
+history_manager = HistoryManager(summarize_history, acquire_slot=lambda: stage_budgets.try_acquire("llm"),
+                                 executor=llm_executor)
+
+def build_prompt(messages, contents, query):
+    """Compacts earlier turns and puts the retrieved contents into the last user message."""
+    with span("prompt_build") as attrs:
+        base_tokens = estimate_tokens(INSTRUCTION_PROMPT.format(content="", query=query))
+        content = "/n".join(contents)
+        history = history_manager.compact(messages[:-1], reserve_tokens=base_tokens + estimate_tokens(content))
+        # Whatever the history leaves of the token cap bounds the retrieved context.
+        content_tokens = history_manager.max_prompt_tokens - base_tokens - message_tokens(history)
+        content = content[:max(content_tokens, 0) * CHARS_PER_TOKEN]
+        prompt = INSTRUCTION_PROMPT.format(content=content, query=query)
+        messages = history + [{**messages[-1], "content": prompt}]
+        attrs["chars"] = len(prompt)
+        attrs["prompt_tokens_estimate"] = message_tokens(messages)
+    logger.info("Built prompt from %d pages (%d chars, %d history messages)", len(contents), len(prompt), len(history))
+    return messages
+
+async def traced_stream(stream, trace_id, start, llm_slot, tier, prompt_tokens):
+    """Passes chunks through, then frees the LLM slot and records the request total and tier usage."""
+    start_trace(trace_id)
+    error = None
+    llm_start = time.perf_counter()
+    completion_chars = 0
+    try:
+        async for chunk in stream:
+            completion_chars += len(chunk)
+            yield chunk
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        llm_slot.release()
+        tier_policy.record("stream_generate", tier, time.perf_counter() - llm_start,
+                           prompt_tokens, completion_chars // CHARS_PER_TOKEN)
+        record_stage("request.stream_generate", time.perf_counter() - start, error=error, tier=tier)
+
+@app.exception_handler(Rejected)
+async def rejected_handler(request, exc: Rejected):
+    return JSONResponse({"detail": exc.reason}, status_code=exc.status_code,
+                        headers={"Retry-After": str(exc.retry_after)})
+
+@app.on_event("startup")
+async def warm_up_resources():
+    """Builds the LLM client and fetch pool before the first request (WARMUP_ON_STARTUP=0 to skip)."""
+    if WARMUP_ON_STARTUP:
+        timings = await asyncio.to_thread(warm_up)
+        logger.info("Warm-up finished: %s", {name: round(s, 2) for name, s in timings.items()})
+
+async def generate_with_tier(messages, tier, model):
+    start = time.perf_counter()
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(executor, extract_info_sync, url)
+    async with stage_budgets.limit("llm"):
+        response = await loop.run_in_executor(llm_executor, contextvars.copy_context().run,
+                                              llm.get().generate, messages, model)
+    tier_policy.record("generate", tier, time.perf_counter() - start,
+                       message_tokens(messages), estimate_tokens(response or ""))
+    return response
 
 @app.post("/generate")
-def generate(request: Request):
-    messages = request.messages
-    query = messages[-1]['content']
-    urls: list = tavily_tool(query)
-    contents = [extract_info_tool(url) for url in urls]
-    print(contents)
-    prompt = INSTRUCTION_PROMPT.format(content="/n".join(contents), query=query)
-    messages[-1]['content'] = prompt
-    response = llm.generate(messages, os.environ["MODEL"])
+async def generate(request: Request):
+    start_trace()
+    with span("request.generate"):
+        messages = request.messages
+        query = messages[-1]['content']
+        contents = await retrieve_contents(query)
+        messages = build_prompt(messages, contents, query)
+        tier, model = tier_policy.model_for("generate", query, sum(len(c) for c in contents))
+        response = await generate_with_tier(messages, tier, model)
+        # A fast-tier answer that hedges or comes back empty is retried once on the large model.
+        if tier != "large" and looks_unsure(response):
+            tier, model = tier_policy.escalate("generate", tier)
+            response = await generate_with_tier(messages, tier, model)
     return {
         "content": response
     }
 
 @app.post("/stream_generate")
 async def generate(request: Request):
+    start = time.perf_counter()
+    trace_id = start_trace()
     messages = request.messages
     query = messages[-1]['content']
-    urls: list = tavily_tool(query)
-    contents = await asyncio.gather(*[async_extract_info_tool_multiprocess(url) for url in urls])
-    print(contents)
-    prompt = INSTRUCTION_PROMPT.format(content="/n".join(contents), query=query)
-    messages[-1]['content'] = prompt
-    return StreamingResponse(llm.stream_generate(messages, os.environ["MODEL"]), media_type="text/plain")
+    contents = await retrieve_contents(query)
+    messages = build_prompt(messages, contents, query)
+    # A stream cannot be taken back, so the tier is chosen up front and never escalated.
+    tier, model = tier_policy.model_for("stream_generate", query, sum(len(c) for c in contents))
+    # Taken before the response starts so overload still gets a 503 instead of a broken stream.
+    llm_slot = await stage_budgets.acquire("llm")
+    stream = traced_stream(llm.get().stream_generate(messages, model), trace_id, start, llm_slot,
+                           tier, message_tokens(messages))
+    # The background task frees the slot if the stream is never iterated (client gone).
+    return StreamingResponse(stream, media_type="text/plain", headers={"X-Trace-Id": trace_id},
+                             background=BackgroundTask(llm_slot.release))
+
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces")
+def traces(trace_id: t.Optional[str] = None):
+    """Recent spans as Chrome trace events; save the JSON and open it in Perfetto."""
+    return chrome_trace(trace_id)
+
+@app.get("/stats/tiers")
+def tier_stats():
+    return tier_policy.stats()
+
+@app.get("/stats/admission")
+def admission_stats():
+    return {"requests": admission.stats(), "stages": stage_budgets.stats()}
 
+@app.get("/stats/domains")
+def domain_stats():
+    return planner.stats()
 
+@app.get("/stats/singleflight")
+def singleflight_stats():
+    return all_stats()
 
 @app.get("/")
 def home():
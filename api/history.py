@@ -0,0 +1,190 @@
+import asyncio
+import contextvars
+import hashlib
+import logging
+import os
+import typing as t
+from collections import OrderedDict
+from concurrent.futures import Executor
+
+from prompt import SUMMARY_PROMPT, HISTORY_SUMMARY_MESSAGE
+from utils.tracing import metrics
+
+logger = logging.getLogger(__name__)
+
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "3"))
+HISTORY_MAX_PROMPT_TOKENS = int(os.getenv("HISTORY_MAX_PROMPT_TOKENS", "12000"))
+HISTORY_SUMMARY_WORDS = int(os.getenv("HISTORY_SUMMARY_WORDS", "200"))
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "2048"))
+
+# Marker INSTRUCTION_PROMPT puts before the user's question; anything before it is retrieved context.
+QUERY_MARKER = "Câu hỏi của người dùng:"
+# Vietnamese text runs at roughly 3 characters per token on Gemini/GPT tokenizers.
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def message_tokens(messages: t.List[t.Dict]) -> int:
+    return sum(estimate_tokens(str(m.get("content", ""))) + 4 for m in messages)
+
+
+def strip_context(message: t.Dict) -> t.Dict:
+    """Drops retrieved page contents from an earlier turn that still carries INSTRUCTION_PROMPT."""
+    content = message.get("content")
+    if isinstance(content, str) and QUERY_MARKER in content:
+        return {**message, "content": content.rsplit(QUERY_MARKER, 1)[1].strip()}
+    return message
+
+
+class HistoryManager:
+    """Keeps the last turns verbatim and folds older ones into a cached rolling summary.
+
+    Summaries are keyed by a hash of the folded messages, so each new turn only
+    summarizes what was added since the last cached prefix. On a cache miss the
+    request does not wait for the LLM: a trimmed extract of the older turns is
+    used and the summary is computed in the background for the next turn.
+    Background summaries run on executor and only when acquire_slot() hands out
+    a free LLM slot; otherwise they are dropped and retried on a later miss.
+    """
+
+    def __init__(
+        self,
+        summarize: t.Callable[[str], str],
+        keep_turns: int = HISTORY_KEEP_TURNS,
+        max_prompt_tokens: int = HISTORY_MAX_PROMPT_TOKENS,
+        summary_words: int = HISTORY_SUMMARY_WORDS,
+        cache_size: int = HISTORY_CACHE_SIZE,
+        acquire_slot: t.Optional[t.Callable[[], t.Any]] = None,
+        executor: t.Optional[Executor] = None,
+    ):
+        self.summarize = summarize
+        self.acquire_slot = acquire_slot
+        self.executor = executor
+        self.keep_turns = keep_turns
+        self.max_prompt_tokens = max_prompt_tokens
+        self.summary_words = summary_words
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._pending: t.Dict[str, asyncio.Future] = {}
+
+    def compact(self, history: t.List[t.Dict], reserve_tokens: int = 0) -> t.List[t.Dict]:
+        """Returns system messages, an optional summary message and the recent turns.
+
+        history excludes the current question. reserve_tokens is the budget kept
+        for the current question and its retrieved context.
+        """
+        system = [m for m in history if m.get("role") == "system"]
+        turns = [strip_context(m) for m in history if m.get("role") != "system"]
+
+        keep = self.keep_turns * 2
+        older, recent = turns[:-keep] if keep else turns, turns[-keep:] if keep else []
+        budget = self.max_prompt_tokens - reserve_tokens - message_tokens(system)
+        # Fold the oldest recent turns too while the history does not fit its budget.
+        summary_budget = self.summary_words * 2
+        while recent and message_tokens(recent) + (summary_budget if older else 0) > budget:
+            older.append(recent.pop(0))
+
+        compacted = list(system)
+        if older:
+            summary = self._summary_for(older, self._summary_chars(min(summary_budget, budget - message_tokens(recent))))
+            if summary:
+                compacted.append({"role": "system", "content": HISTORY_SUMMARY_MESSAGE.format(summary=summary)})
+        compacted += recent
+        assert message_tokens(compacted[len(system):]) <= max(budget, 0), "compacted history exceeds its budget"
+
+        metrics.inc("history_messages_folded_total", len(older), help="Older chat messages replaced by a summary.")
+        return compacted
+
+    @staticmethod
+    def _summary_chars(tokens: int) -> int:
+        """Longest summary whose HISTORY_SUMMARY_MESSAGE fits in tokens (as counted by message_tokens)."""
+        overhead = len(HISTORY_SUMMARY_MESSAGE.format(summary=""))
+        return max((tokens - 5) * CHARS_PER_TOKEN - overhead, 0)
+
+    def _summary_for(self, older: t.List[t.Dict], max_chars: int) -> str:
+        # Longest cached prefix of the folded messages, hashed incrementally.
+        digest = hashlib.sha256()
+        keys = []
+        for message in older:
+            digest.update(f"{message.get('role')}\x00{message.get('content')}\x01".encode("utf-8"))
+            keys.append(digest.hexdigest())
+
+        cached_at, previous = 0, ""
+        for i in range(len(keys), 0, -1):
+            if keys[i - 1] in self._cache:
+                cached_at, previous = i, self._cache[keys[i - 1]]
+                self._cache.move_to_end(keys[i - 1])
+                break
+
+        if cached_at == len(older):
+            metrics.inc("history_summary_cache_total", help="Summary lookups by outcome.", outcome="hit")
+            return previous[:max_chars]
+        metrics.inc("history_summary_cache_total", outcome="miss")
+
+        new_turns = older[cached_at:]
+        self._schedule(keys[-1], previous, new_turns)
+        return self._extract(previous, new_turns, max_chars)
+
+    def _schedule(self, key: str, previous: str, new_turns: t.List[t.Dict]):
+        if key in self._pending:
+            return
+        prompt = SUMMARY_PROMPT.format(
+            max_words=self.summary_words, summary=previous, conversation=self._render(new_turns)
+        )
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._store(key, self.summarize(prompt))
+            return
+        slot = self.acquire_slot() if self.acquire_slot is not None else None
+        if self.acquire_slot is not None and slot is None:
+            metrics.inc("history_summary_dropped_total", help="Background summaries skipped for lack of an LLM slot.")
+            return
+        future = loop.run_in_executor(self.executor, contextvars.copy_context().run, self.summarize, prompt)
+        self._pending[key] = future
+        future.add_done_callback(lambda done: self._on_summary(key, done))
+        if slot is not None:
+            future.add_done_callback(lambda _: slot.release())
+
+    def _on_summary(self, key: str, task: asyncio.Future):
+        self._pending.pop(key, None)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.warning("History summary failed: %s", task.exception())
+            return
+        self._store(key, task.result())
+
+    def _store(self, key: str, summary: str):
+        self._cache[key] = summary.strip()
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _extract(self, previous: str, new_turns: t.List[t.Dict], max_chars: int) -> str:
+        """Cheap stand-in while the real summary is computed: the start of each turn.
+
+        At most max_chars in total; the newest turns are kept first, then as much
+        of the previous summary as still fits.
+        """
+        per_turn = max(80, max_chars // max(len(new_turns), 1))
+        lines, used = [], 0
+        for message in reversed(new_turns):
+            line = f"{message.get('role')}: {str(message.get('content', ''))[:per_turn]}"
+            if used + len(line) > max_chars:
+                if not lines:
+                    lines.append(line[:max_chars])
+                    used = max_chars
+                break
+            lines.append(line)
+            used += len(line) + 1
+        if previous and used < max_chars:
+            lines.append(previous[:max_chars - used])
+        return "\n".join(reversed(lines))
+
+    @staticmethod
+    def _render(turns: t.List[t.Dict]) -> str:
+        return "\n".join(f"{m.get('role')}: {m.get('content')}" for m in turns)
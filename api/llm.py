@@ -1,30 +1,73 @@
 import json
+import time
 import typing as t
-from litellm import completion
+from utils.tracing import metrics, record_stage, span
 class VertexLLM:
     def __init__(self):
+        # litellm takes about a second to import: load it with the client, not with this module.
+        import litellm
         with open(r"..\account.json", 'r') as f:
             self.credentials = json.load(f)
     
     def generate(self, messages:t.List[t.Dict], model):
-        response = completion(
-            model=model,
-            messages=messages,
-            vertex_credentials=self.credentials,
-            max_tokens=8192
-        )
+        from litellm import completion
+        with span("llm.generate", model=model) as attrs:
+            response = completion(
+                model=model,
+                messages=messages,
+                vertex_credentials=self.credentials,
+                max_tokens=8192
+            )
+            usage = getattr(response, "usage", None)
+            if usage:
+                attrs["prompt_tokens"] = usage.prompt_tokens
+                attrs["completion_tokens"] = usage.completion_tokens
+                _count_tokens(model, usage.prompt_tokens, usage.completion_tokens)
         return response.choices[0].message.content
     
     async def stream_generate(self, messages:t.List[t.Dict], model):
-        response = completion(
+        from litellm import acompletion, token_counter
+        start = time.perf_counter()
+        first_chunk_at = None
+        text = []
+        usage = None
+        # Async client: a slow stream must not block the event loop for other requests.
+        response = await acompletion(
             model=model,
             messages=messages,
             vertex_credentials=self.credentials,
             stream=True
         )
-        for chunk in response:
+        async for chunk in response:
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
             content = chunk.choices[0].delta.content
             if content:
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                    record_stage("llm.ttft", first_chunk_at - start, model=model)
+                text.append(content)
                 yield json.dumps({
                 "chunk":content
-                })
\ No newline at end of file
+                })
+
+        end = time.perf_counter()
+        if usage:
+            prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+        else:
+            prompt_tokens = token_counter(model=model, messages=messages)
+            completion_tokens = token_counter(model=model, text="".join(text))
+        _count_tokens(model, prompt_tokens, completion_tokens)
+        if first_chunk_at is not None and end > first_chunk_at:
+            metrics.observe("llm_tokens_per_second", completion_tokens / (end - first_chunk_at),
+                            help="Streaming decode rate after the first chunk.",
+                            buckets=(5, 10, 20, 40, 80, 160, 320), model=model)
+        record_stage("llm.stream", end - start, model=model,
+                     prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+def _count_tokens(model, prompt_tokens, completion_tokens):
+    metrics.inc("llm_tokens_total", prompt_tokens, help="Tokens sent to and received from the LLM.",
+                model=model, kind="prompt")
+    metrics.inc("llm_tokens_total", completion_tokens, model=model, kind="completion")
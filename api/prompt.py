@@ -11,4 +11,18 @@ Nội dung thông tin tìm kiếm:
 {content}
 Câu hỏi của người dùng:
 {query}
-"""
\ No newline at end of file
+"""
+
+SUMMARY_PROMPT = """
+Tóm tắt cuộc hội thoại giữa người dùng và Soni dưới đây thành một đoạn ngắn (tối đa {max_words} từ).
+Giữ lại các sự kiện, tên riêng, con số và những điều người dùng đã hỏi hoặc yêu cầu; bỏ qua lời chào hỏi.
+Tóm tắt trước đó (có thể trống):
+{summary}
+Các lượt hội thoại mới:
+{conversation}
+"""
+
+HISTORY_SUMMARY_MESSAGE = """
+Tóm tắt các lượt hội thoại trước với người dùng:
+{summary}
+"""
@@ -0,0 +1,83 @@
+"""Compares the old BeautifulSoup extractors with utils.html_extract.
+
+    python -m benchmarks.bench_extraction                 # synthetic news pages
+    python -m benchmarks.bench_extraction saved/*.html    # real pages saved to disk
+
+Reports CPU time per page and output size; tokens are estimated as chars / 4.
+"""
+import argparse
+import glob
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.fakes import make_page
+from utils.html_extract import available_backends, extract_text
+
+
+def legacy_api_get_text(html):
+    """api/api.py get_web_content before the extraction engine."""
+    return BeautifulSoup(html, "html.parser").get_text()
+
+
+def legacy_clean_html(html):
+    """tools/web_tools.py clean_html before the extraction engine."""
+    soup = BeautifulSoup(html, "html.parser")
+    for script_or_style in soup(["script", "style"]):
+        script_or_style.decompose()
+    return soup.get_text(separator=" ", strip=True)
+
+
+def legacy_facebook_divs(html):
+    """get_facebook_content before the extraction engine: every nested div's text joined."""
+    soup = BeautifulSoup(html, "html.parser")
+    return " ".join(div.get_text(separator=" ", strip=True) for div in soup.find_all("div"))
+
+
+def run(name, fn, pages, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        outputs = [fn(page) for page in pages]
+    cpu_ms = (time.process_time() - start) * 1000 / (repeat * len(pages))
+    chars = sum(len(o) for o in outputs) / len(outputs)
+    return {"extractor": name, "cpu_ms_per_page": round(cpu_ms, 2), "chars": int(chars), "est_tokens": int(chars / 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="HTML files to use instead of synthetic pages.")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-chars", type=int, default=None, help="Output cap for the new engine (default: its own).")
+    args = parser.parse_args()
+
+    if args.files:
+        pages = []
+        for pattern in args.files:
+            for path in glob.glob(pattern):
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    pages.append(f.read())
+    else:
+        pages = [make_page(i, args.paragraphs) for i in range(args.pages)]
+    # Facebook-like markup: content nested several divs deep.
+    nested = ["<div>" * 8 + page + "</div>" * 8 for page in pages]
+
+    cap = {"max_chars": args.max_chars} if args.max_chars else {}
+    rows = [
+        run("legacy api get_text", legacy_api_get_text, pages, args.repeat),
+        run("legacy clean_html", legacy_clean_html, pages, args.repeat),
+    ]
+    for backend in available_backends():
+        rows.append(run(f"extract_text[{backend}]", lambda h, b=backend: extract_text(h, backend=b, **cap), pages, args.repeat))
+    rows.append(run("legacy facebook divs (nested)", legacy_facebook_divs, nested, args.repeat))
+    rows.append(run("extract_text full page (nested)", lambda h: extract_text(h, main_content=False, **cap), nested, args.repeat))
+
+    width = max(len(r["extractor"]) for r in rows)
+    print(f"{'extractor':<{width}}  cpu_ms/page   chars  est_tokens   ({len(pages)} pages)")
+    for r in rows:
+        print(f"{r['extractor']:<{width}}  {r['cpu_ms_per_page']:>11}  {r['chars']:>6}  {r['est_tokens']:>10}")
+
+
+if __name__ == "__main__":
+    main()
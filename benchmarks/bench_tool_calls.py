@@ -0,0 +1,105 @@
+"""Wall-clock time of one ReAct agent step that issued several tool calls.
+
+    python -m benchmarks.bench_tool_calls
+    python -m benchmarks.bench_tool_calls --urls 8 --latency 0.8
+
+Runs LangGraph's ToolNode on a single AIMessage with N tool calls, once with
+max_concurrency=1 (the calls one after another) and once with the agents'
+tool_config(). Scenarios:
+
+  extract_news  extract_info_tool on N pages of a local server with --latency
+  charts        the matplotlib/seaborn chart tools on a synthetic price history
+                (skipped when matplotlib/seaborn are not installed)
+
+The LLM is not involved: this isolates the tool-execution part of the step.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from langchain_core.messages import AIMessage
+from langgraph.prebuilt import ToolNode
+
+from benchmarks.fakes import StaticSiteServer
+from utils.tool_pool import TOOL_MAX_CONCURRENCY, bounded_tools, tool_config
+
+
+def tool_step(tools, calls):
+    message = AIMessage(content="", tool_calls=[
+        {"name": name, "args": args, "id": f"call_{i}", "type": "tool_call"} for i, (name, args) in enumerate(calls)
+    ])
+    return ToolNode(bounded_tools(tools)), {"messages": [message]}
+
+
+def run(node, state, config, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = node.invoke(state, {**config, "configurable": {}})
+        timings.append(time.perf_counter() - start)
+    ids = [m.tool_call_id for m in result["messages"]]
+    assert ids == [c["id"] for c in state["messages"][0].tool_calls], "results out of order"
+    return min(timings)
+
+
+def extract_news_scenario(args):
+    from tools import web_tools
+
+    server = StaticSiteServer(pages=args.urls, latency=args.latency)
+    server.__enter__()
+    # Cold fetches each time: the singleflight only dedups concurrent calls.
+    calls = [("extract_info_tool", {"url": url}) for url in server.urls]
+    return tool_step([web_tools.extract_info_tool], calls), server
+
+
+def charts_scenario(args):
+    import numpy as np
+    import pandas as pd
+    from tools import finance_tools
+
+    days = pd.date_range("2023-01-01", periods=500)
+    frame = pd.DataFrame({
+        "time": days,
+        "close": 100 + np.cumsum(np.random.default_rng(0).standard_normal(len(days))),
+        "volume": np.random.default_rng(1).integers(1_000, 100_000, len(days)),
+    })
+    finance_tools._fetch_quote_history = lambda *a: frame
+    # The chart tools save into the working directory.
+    os.chdir(tempfile.mkdtemp(prefix="bench_charts_"))
+    spec = "VNM|2023-01-01|2024-05-15|1D"
+    tools = [finance_tools.plot_volume_chart, finance_tools.plot_line_chart, finance_tools.plot_monthly_returns_heatmap]
+    calls = [(tool.name, {"symbol_and_dates": spec}) for tool in tools]
+    return tool_step(tools, calls), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--urls", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.5, help="Per-page server latency in seconds.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-concurrency", type=int, default=TOOL_MAX_CONCURRENCY)
+    args = parser.parse_args()
+
+    rows = []
+    for name, scenario in [("extract_news", extract_news_scenario), ("charts", charts_scenario)]:
+        try:
+            (node, state), server = scenario(args)
+        except ImportError as e:
+            print(f"{name}: skipped ({e})")
+            continue
+        try:
+            serial = run(node, state, {"max_concurrency": 1}, args.repeat)
+            parallel = run(node, state, tool_config(args.max_concurrency), args.repeat)
+        finally:
+            if server:
+                server.__exit__(None, None, None)
+        rows.append((name, len(state["messages"][0].tool_calls), serial, parallel))
+
+    print(f"{'scenario':<14} calls  serial_s  parallel_s  speedup   (max_concurrency={args.max_concurrency})")
+    for name, calls, serial, parallel in rows:
+        print(f"{name:<14} {calls:>5}  {serial:>8.2f}  {parallel:>10.2f}  {serial / parallel:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
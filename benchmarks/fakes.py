@@ -0,0 +1,121 @@
+"""Local stand-ins for the API's upstream services, used by the benchmarks.
+
+None of these touch the network: the LLM streams canned tokens at a fixed rate,
+and Tavily returns URLs on a local static HTTP server.
+"""
+import asyncio
+import json
+import threading
+import time
+import typing as t
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOREM = (
+    "Đại học Bách Khoa Hà Nội tổ chức sự kiện Innovation Day với sự tham gia của nhiều câu lạc bộ "
+    "sinh viên, doanh nghiệp và giảng viên. Chương trình gồm các phiên trình diễn sản phẩm, hội thảo "
+    "chuyên đề và cuộc thi khởi nghiệp. "
+)
+
+
+class MockLLM:
+    """Drop-in for api.llm.VertexLLM that emits tokens at a configurable rate."""
+
+    def __init__(self, tokens_per_second: float = 50.0, output_tokens: int = 100, first_token_latency: float = 0.2):
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.first_token_latency = first_token_latency
+
+    def _tokens(self):
+        words = LOREM.split()
+        return [words[i % len(words)] + " " for i in range(self.output_tokens)]
+
+    def generate(self, messages: t.List[t.Dict], model):
+        time.sleep(self.first_token_latency + self.output_tokens / self.tokens_per_second)
+        return "".join(self._tokens())
+
+    async def stream_generate(self, messages: t.List[t.Dict], model):
+        await asyncio.sleep(self.first_token_latency)
+        for token in self._tokens():
+            yield json.dumps({"chunk": token})
+            await asyncio.sleep(1 / self.tokens_per_second)
+
+
+def make_page(index: int, paragraphs: int = 30) -> str:
+    """Builds a news-like page with navigation, footer and a main article body."""
+    nav = "".join(f'<li><a href="/section/{i}">Chuyên mục {i}</a></li>' for i in range(40))
+    body = "".join(f"<p>{LOREM * 2}</p>" for _ in range(paragraphs))
+    return (
+        f"<html><head><title>Bài viết {index}</title><style>body{{font:14px}}</style>"
+        f"<script>var tracking = {index};</script></head><body>"
+        f'<header><nav class="menu"><ul>{nav}</ul></nav></header>'
+        f'<main><article><h1>Bài viết số {index}</h1>{body}</article></main>'
+        f'<aside class="sidebar">{nav}</aside><footer class="footer">Bản quyền © Soni {index}</footer>'
+        "</body></html>"
+    )
+
+
+class StaticSiteServer:
+    """Serves make_page() documents on localhost from a background thread."""
+
+    def __init__(self, pages: int = 8, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.pages = {f"/page/{i}": make_page(i).encode("utf-8") for i in range(pages)}
+        latency_s = latency
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = server.pages.get(self.path)
+                if latency_s:
+                    time.sleep(latency_s)
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def urls(self) -> t.List[str]:
+        return [self.base_url + path for path in self.pages]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def fake_tavily_class(urls: t.List[str], latency: float = 0.3):
+    """Returns a TavilySearchResults replacement whose results point at the given URLs."""
+
+    class FakeTavilySearchResults:
+        def __init__(self, max_results: int = 5, **kwargs):
+            self.max_results = max_results
+
+        def invoke(self, query):
+            time.sleep(latency)
+            return [
+                {"url": url, "content": LOREM, "score": 0.9 - i * 0.01}
+                for i, url in enumerate(urls[: self.max_results])
+            ]
+
+    return FakeTavilySearchResults
+
@@ -0,0 +1,101 @@
+"""Import-time budget check for the API and tool modules.
+
+Imports each module in a fresh interpreter and fails (exit code 1) if it takes
+longer than its budget or pulls in a heavy dependency that should only load
+lazily. Run it in CI or before deploying:
+
+    python -m benchmarks.import_budget [--scale 2.0] [--top 10]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+TARGETS = [
+    {
+        "module": "tools.finance_tools",
+        "budget_s": 1.5,
+        "forbidden": ["torch", "sentence_transformers", "pymongo", "vnstock", "matplotlib", "plotly", "seaborn"],
+    },
+    {
+        "module": "tools.web_tools",
+        "budget_s": 1.5,
+        "forbidden": ["torch", "sentence_transformers", "pymongo", "selenium", "langchain_experimental"],
+    },
+    {
+        "module": "api",
+        "path": os.path.join(ROOT, "api"),
+        "budget_s": 1.5,
+        "forbidden": ["torch", "selenium", "litellm"],
+    },
+]
+
+PROBE = """
+import json, resource, sys, time
+sys.path[:0] = {paths!r}
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "loaded": [name for name in {forbidden!r} if name in sys.modules],
+}}))
+"""
+
+
+def slowest_imports(importtime_log, top):
+    """Parses `-X importtime` output into the slowest direct imports of the probed module."""
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # Names are indented two spaces per nesting level; keep level 1 so parents and children aren't double-listed.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth != 1:
+            continue
+        rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def check(target, scale, top):
+    paths = [ROOT] + ([target["path"]] if "path" in target else [])
+    code = PROBE.format(paths=paths, module=target["module"], forbidden=target["forbidden"])
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, cwd=ROOT)
+    if proc.returncode != 0:
+        return False, f"{target['module']}: import failed\n{proc.stderr.strip().splitlines()[-1]}"
+
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    budget = target["budget_s"] * scale
+    ok = result["seconds"] <= budget and not result["loaded"]
+    lines = [
+        f"{'OK  ' if ok else 'FAIL'} {target['module']}: {result['seconds']:.2f}s (budget {budget:.2f}s), "
+        f"max RSS {result['max_rss_mb']:.0f} MB"
+    ]
+    if result["loaded"]:
+        lines.append(f"     eagerly imported: {', '.join(result['loaded'])}")
+    for cumulative_us, name in slowest_imports(proc.stderr, top):
+        lines.append(f"     {cumulative_us / 1e6:6.2f}s  {name}")
+    return ok, "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget, e.g. on slow CI machines.")
+    parser.add_argument("--top", type=int, default=5, help="Slowest direct imports to list per module.")
+    args = parser.parse_args()
+
+    failed = False
+    for target in TARGETS:
+        ok, report = check(target, args.scale, args.top)
+        print(report)
+        failed |= not ok
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
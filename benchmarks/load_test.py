@@ -0,0 +1,188 @@
+"""Load and latency benchmark for the FastAPI app, fully offline.
+
+Starts api/api.py in-process with MockLLM, a fake Tavily and a local static
+site, then drives concurrent /generate and /stream_generate traffic. Needs
+uvicorn and httpx in addition to the API requirements (psutil is optional).
+
+    python -m benchmarks.load_test --concurrency 16 --requests 200 --token-rate 80
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import statistics
+import sys
+import threading
+import time
+import types
+
+import httpx
+import uvicorn
+
+from benchmarks.fakes import MockLLM, StaticSiteServer, fake_tavily_class
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def load_app(args, urls):
+    """Imports api/api.py with the LLM and Tavily replaced by local fakes."""
+    sys.path.insert(0, os.path.join(ROOT, "api"))
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault("MODEL", "mock")
+    # The benchmark stands in for a proxy in front of its simulated clients.
+    os.environ.setdefault("ADMISSION_TRUSTED_PROXIES", "127.0.0.1")
+
+    mock_llm = MockLLM(args.token_rate, args.output_tokens, args.first_token_latency)
+    fake_llm_module = types.ModuleType("llm")
+    fake_llm_module.VertexLLM = lambda: mock_llm
+    sys.modules["llm"] = fake_llm_module
+
+    import api
+    fake_tavily = fake_tavily_class(urls, latency=args.search_latency)
+    api.tavily_search.factory = lambda: fake_tavily(max_results=8)
+    return api.app
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app, port):
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def rss_mb():
+    """Peak RSS of this process and of its (pool) children, in MB."""
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    try:
+        import psutil
+        proc = psutil.Process()
+        current = proc.memory_info().rss + sum(c.memory_info().rss for c in proc.children(recursive=True))
+        return {"peak_self": self_kb / 1024, "peak_children": children_kb / 1024, "current_total": current / 2**20}
+    except ImportError:
+        return {"peak_self": self_kb / 1024, "peak_children": children_kb / 1024}
+
+
+async def one_request(client, endpoint, payload, headers):
+    start = time.perf_counter()
+    first_chunk = None
+    if endpoint == "/stream_generate":
+        async with client.stream("POST", endpoint, json=payload, headers=headers) as response:
+            async for chunk in response.aiter_bytes():
+                if chunk and first_chunk is None:
+                    first_chunk = time.perf_counter()
+            status = response.status_code
+    else:
+        response = await client.post(endpoint, json=payload, headers=headers)
+        status = response.status_code
+    end = time.perf_counter()
+    return {"status": status, "ttfc": (first_chunk or end) - start, "total": end - start}
+
+
+async def drive(base_url, endpoint, args):
+    queries = [f"Sự kiện Innovation Day {i % args.distinct_queries}" for i in range(args.requests)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        async def worker(i, query):
+            async with semaphore:
+                payload = {"messages": [{"role": "user", "content": query}]}
+                headers = {"X-Client-Id": f"bench-{i % args.clients}"}
+                try:
+                    return await one_request(client, endpoint, payload, headers)
+                except httpx.HTTPError as e:
+                    return {"status": type(e).__name__, "ttfc": None, "total": None}
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[worker(i, q) for i, q in enumerate(queries)])
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(endpoint, results, elapsed):
+    ok = [r for r in results if r["status"] == 200]
+    # Sheds are cheap by design; percentiles cover served requests only.
+    ttfc = [r["ttfc"] for r in ok]
+    return {
+        "endpoint": endpoint,
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "rejected_429": sum(1 for r in results if r["status"] == 429),
+        "rejected_503": sum(1 for r in results if r["status"] == 503),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "ttfc_p50_ms": _ms(percentile(ttfc, 50)),
+        "ttfc_p95_ms": _ms(percentile(ttfc, 95)),
+        "ttfc_p99_ms": _ms(percentile(ttfc, 99)),
+        "total_mean_ms": _ms(statistics.mean(r["total"] for r in ok) if ok else None),
+    }
+
+
+def _ms(value):
+    return round(value * 1000, 1) if value is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", choices=["generate", "stream_generate", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=64, help="Distinct X-Client-Id values, for per-client limits.")
+    parser.add_argument("--distinct-queries", type=int, default=8, help="Repeated queries exercise request coalescing.")
+    parser.add_argument("--pages", type=int, default=5, help="Pages returned per fake Tavily search.")
+    parser.add_argument("--page-latency", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    parser.add_argument("--token-rate", type=float, default=50.0, help="Mock LLM tokens per second.")
+    parser.add_argument("--output-tokens", type=int, default=100)
+    parser.add_argument("--first-token-latency", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", help="Also write the report to this file.")
+    args = parser.parse_args()
+
+    endpoints = ["/generate", "/stream_generate"] if args.endpoint == "both" else [f"/{args.endpoint}"]
+
+    with StaticSiteServer(pages=args.pages, latency=args.page_latency) as site:
+        app = load_app(args, site.urls)
+        port = free_port()
+        server, thread = start_server(app, port)
+        report = {"config": vars(args), "results": []}
+        try:
+            for endpoint in endpoints:
+                results, elapsed = asyncio.run(drive(f"http://127.0.0.1:{port}", endpoint, args))
+                report["results"].append(summarize(endpoint, results, elapsed))
+        finally:
+            server.should_exit = True
+            thread.join(timeout=10)
+        report["memory_mb"] = rss_mb()
+
+    for row in report["results"]:
+        print(" ".join(f"{k}={v}" for k, v in row.items()))
+    print("memory_mb " + " ".join(f"{k}={round(v, 1)}" for k, v in report["memory_mb"].items()))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
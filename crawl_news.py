@@ -1,18 +1,31 @@
 import requests
 from bs4 import BeautifulSoup
+import argparse
+import asyncio
 import time
 import urllib.parse
 import re
 import logging
 from datetime import datetime, timedelta
-from pymongo import MongoClient
-import pymongo
 from sentence_transformers import SentenceTransformer
-import os
 from dotenv import load_dotenv
 
+from utils import db
+from utils.crawl_schedule import CrawlScheduler, site_of
+from utils.embeddings import embedding_fields
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+REQUEST_TIMEOUT = 15
+
+# Each entry is one listing page (section); it gets its own poll interval.
+SITES = [
+    {"url": "https://cafef.vn/thi-truong-chung-khoan.chn", "selectors": ['h3.title a', 'div.box-category-item a', 'article a']},
+    {"url": "https://vnexpress.net/kinh-doanh/chung-khoan", "selectors": ['h3.title-news a', 'article a']},
+    {"url": "https://tuoitre.vn/kinh-doanh.htm", "selectors": ['h3.title-news a', 'article a']}
+]
+
 def get_full_url(base_url, relative_url):
     if not relative_url:
         return ""
@@ -31,7 +44,7 @@ def parse_relative_time(relative_time):
 
 def get_article_details(article_url, headers, model):
     try:
-        article_response = requests.get(article_url, headers=headers)
+        article_response = requests.get(article_url, headers=headers, timeout=REQUEST_TIMEOUT)
         article_response.encoding = 'utf-8'
         article_soup = BeautifulSoup(article_response.text, 'html.parser')
 
@@ -50,7 +63,8 @@ def get_article_details(article_url, headers, model):
                 description = first_paragraph.get_text(strip=True)
 
 
-        embedding = model.encode(description).tolist() if description else []
+        # No embedding for the placeholder: it would match every query equally.
+        embedding = model.encode(description) if description and description != "Không có mô tả" else None
 
         post_time = None
         time_tag = article_soup.find("span", class_="time") or article_soup.find("div", class_="time")
@@ -69,78 +83,115 @@ def get_article_details(article_url, headers, model):
         return description, post_time, embedding
     except Exception as e:
         logging.error(f"Lỗi khi lấy bài viết {article_url}: {e}")
-        return "Không có mô tả", time.time(), []
+        return "Không có mô tả", time.time(), None
+
+def fetch_listing(site, etag=None, last_modified=None):
+    """Conditional GET of a listing page. Returns (links, etag, last_modified); links is None on 304."""
+    headers = dict(HEADERS)
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    response = requests.get(site["url"], headers=headers, timeout=REQUEST_TIMEOUT)
+    if response.status_code == 304:
+        return None, etag, last_modified
+    response.raise_for_status()
+    response.encoding = 'utf-8'
+    soup = BeautifulSoup(response.text, 'html.parser')
+
+    links = {}
+    for selector in site["selectors"]:
+        for link in soup.select(selector):
+            href = link.get('href', '').strip()
+            title = link.get_text(strip=True)
+            if not href or not title:
+                continue
+            links.setdefault(get_full_url(site["url"], href), title)
+    return links, response.headers.get("ETag"), response.headers.get("Last-Modified")
 
-def crawl_news_urls(sites, model):
-    headers = {"User-Agent": "Mozilla/5.0"}
+def crawl_section(site, model, etag=None, last_modified=None):
+    """Polls one listing page and stores the articles not seen before.
+
+    Returns (new_count, etag, last_modified). Article pages are only fetched for
+    URLs that are not in the database yet.
+    """
+    links, etag, last_modified = fetch_listing(site, etag, last_modified)
+    if not links:
+        return 0, etag, last_modified
+
+    known = db.known_urls(links)
     news_urls = []
-    
-    for site in sites:
+    for full_url, title in links.items():
+        if full_url in known:
+            continue
+        description, post_timestamp, embedding = get_article_details(full_url, HEADERS, model)
+        news_urls.append({
+            "title": title,
+            "full_url": full_url,
+            "description": description,
+            "post_time": post_timestamp,
+            "crawl_timestamp": time.time(),
+            **embedding_fields(embedding)
+        })
+    inserted = db.bulk_insert_news(news_urls)
+    logging.info(f"{site['url']}: {len(links)} liên kết, {len(known)} đã có, thêm {inserted} bài viết mới")
+    return inserted, etag, last_modified
+
+async def run_scheduler(sites=SITES, once=False):
+    """Long-lived crawl daemon: polls each section when the scheduler says it is due.
+
+    Blocking work (requests, parsing, embedding) runs in worker threads; at most
+    one section per site is polled at a time. With once=True every section is
+    polled a single time and the function returns.
+    """
+    model = await asyncio.to_thread(SentenceTransformer, "sentence-transformers/all-MiniLM-L6-v2")
+    await asyncio.to_thread(db.ensure_indexes)
+    by_url = {site["url"]: site for site in sites}
+    scheduler = CrawlScheduler(by_url)
+    scheduler.load(await db.aload_crawl_states())
+    site_locks = {site_of(url): asyncio.Lock() for url in by_url}
+
+    async def poll(url):
+        state = scheduler.state(url)
+        async with site_locks[state.site]:
+            try:
+                new_count, etag, last_modified = await asyncio.to_thread(
+                    crawl_section, by_url[url], model, state.etag, state.last_modified)
+            except Exception as e:
+                logging.error(f"Lỗi crawl {url}: {e}")
+                scheduler.record_error(url)
+            else:
+                state.etag, state.last_modified = etag, last_modified
+                scheduler.record_success(url, new_count)
         try:
-            response = requests.get(site["url"], headers=headers)
-            response.encoding = 'utf-8'
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            for selector in site["selectors"]:
-                for link in soup.select(selector):
-                    href = link.get('href', '').strip()
-                    title = link.get_text(strip=True)  
-                    if not href or not title:
-                        continue
-                    full_url = get_full_url(site["url"], href)
-                    description, post_timestamp, embedding = get_article_details(full_url, headers, model)
-                    
-                    news_urls.append({
-                        "title": title,
-                        "full_url": full_url,
-                        "description": description,
-                        "post_time": post_timestamp,
-                        "crawl_timestamp": time.time(),
-                        "embedding": embedding
-                    })
+            await db.asave_crawl_state(state.as_dict())
         except Exception as e:
-            logging.error(f"Lỗi crawl {site['url']}: {e}")
-    
-    return news_urls
+            logging.error(f"Lỗi lưu lịch crawl {url}: {e}")
+        logging.info(f"{url}: lần crawl tiếp theo sau {max(0, state.next_run - time.time()) / 60:.1f} phút")
 
-def main():
-    load_dotenv()
-    model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-    mongodb_url = os.getenv("MONGODB_URI")
-    client = MongoClient(mongodb_url)
-    db = client["Soni_Agent"]
-    collection = db["stock_news"]
-    config_collection = db["configs"]
-
-    sites = [
-        {"url": "https://cafef.vn/thi-truong-chung-khoan.chn", "selectors": ['h3.title a', 'div.box-category-item a', 'article a']},
-        {"url": "https://vnexpress.net/kinh-doanh/chung-khoan", "selectors": ['h3.title-news a', 'article a']},
-        {"url": "https://tuoitre.vn/kinh-doanh.htm", "selectors": ['h3.title-news a', 'article a']}
-    ]
+    if once:
+        await asyncio.gather(*(poll(url) for url in by_url))
+        return
 
+    running = {}
     while True:
-        last_crawl = config_collection.find_one({"name": "last_crawl_timestamp"})
-        last_crawl_timestamp = last_crawl["timestamp"] if last_crawl else 0
-        
-        news_data = crawl_news_urls(sites, model)
-        if news_data:
-            for news in news_data:
-                if news["post_time"] > last_crawl_timestamp and not collection.find_one({"full_url": news["full_url"]}):
-                    collection.insert_one(news)
-                    logging.info(f"Đã thêm: {news['title']}")
-                else:
-                    logging.info(f"Bỏ qua bài viết đã tồn tại hoặc cũ: {news['title']}")
-            
-            config_collection.update_one(
-                {"name": "last_crawl_timestamp"}, 
-                {"$set": {"timestamp": time.time()}}, 
-                upsert=True
-            )
+        for state in scheduler.due():
+            if state.url not in running:
+                running[state.url] = asyncio.create_task(poll(state.url))
+        timeout = max(0.0, scheduler.next_wakeup(exclude=running) - time.time())
+        if running:
+            done, _ = await asyncio.wait(running.values(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for url in [url for url, task in running.items() if task in done]:
+                running.pop(url).result()
         else:
-            logging.info("Không tìm thấy bài viết nào mới.")
-        
-        logging.info("Chờ 1h trước lần crawl tiếp theo...")
-        time.sleep(3600*60)
+            await asyncio.sleep(timeout)
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Crawl stock news with per-section adaptive polling.")
+    parser.add_argument("--once", action="store_true", help="Poll every section once and exit.")
+    args = parser.parse_args()
+    asyncio.run(run_scheduler(once=args.once))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""Re-encodes stock_news embeddings into the compact storage format, in resumable batches.
+
+    python migrate_embeddings.py --format int8 --batch-size 500
+
+Progress is checkpointed in the configs collection after every batch, so an
+interrupted run continues where it stopped. Empty embeddings ([]) left by failed
+crawls are removed; with --reembed they are recomputed from the description.
+"""
+import argparse
+import logging
+import time
+
+import bson
+from dotenv import load_dotenv
+
+from utils import db
+from utils.embeddings import EMBEDDING_FORMAT, decode_embedding, embedding_fields, version_of
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PLACEHOLDER_DESCRIPTION = "Không có mô tả"
+
+
+def checkpoint_name(fmt):
+    return f"embedding_migration_{fmt}"
+
+
+def _field_bytes(fields):
+    return len(bson.encode(fields)) if fields else 0
+
+
+def plan_update(doc, fmt, model=None):
+    """The update for one document, or None when it is already in the target format."""
+    embedding = doc.get("embedding")
+    if embedding is None or len(embedding) == 0:
+        description = doc.get("description")
+        if model is not None and description and description != PLACEHOLDER_DESCRIPTION:
+            return {"$set": embedding_fields(model.encode(description), fmt)}
+        if embedding is not None:
+            return {"$unset": {"embedding": "", "embedding_v": ""}}
+        return None
+    if doc.get("embedding_v") == version_of(fmt):
+        return None
+    return {"$set": embedding_fields(decode_embedding(embedding), fmt)}
+
+
+def migrate(fmt=EMBEDDING_FORMAT, batch_size=500, reembed=False, restart=False):
+    version_of(fmt)  # fail fast on an unknown format
+    model = None
+    if reembed:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+
+    name = checkpoint_name(fmt)
+    last_id = None if restart else db.get_config(name)
+    if last_id is not None:
+        logging.info(f"Tiếp tục từ checkpoint _id > {last_id}")
+
+    news = db.collection(db.NEWS)
+    projection = {"embedding": 1, "embedding_v": 1, "description": 1}
+    totals = {"scanned": 0, "updated": 0, "bytes_before": 0, "bytes_after": 0}
+    started = time.time()
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = list(news.find(query, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        updates = []
+        for doc in batch:
+            update = plan_update(doc, fmt, model)
+            if update is None:
+                continue
+            before = {"embedding": doc["embedding"]} if doc.get("embedding") is not None else {}
+            totals["bytes_before"] += _field_bytes(before)
+            totals["bytes_after"] += _field_bytes(update.get("$set"))
+            updates.append(({"_id": doc["_id"]}, update))
+
+        totals["updated"] += db.bulk_update(db.NEWS, updates)["modified"]
+        totals["scanned"] += len(batch)
+        last_id = batch[-1]["_id"]
+        db.set_config(name, last_id)
+        logging.info(f"Đã quét {totals['scanned']} bài, cập nhật {totals['updated']} "
+                     f"({totals['scanned'] / max(time.time() - started, 1e-6):.0f} bài/s)")
+
+    ratio = totals["bytes_before"] / totals["bytes_after"] if totals["bytes_after"] else 0
+    logging.info(f"Hoàn tất: {totals['updated']}/{totals['scanned']} bài, embedding "
+                 f"{totals['bytes_before']} -> {totals['bytes_after']} bytes (x{ratio:.1f})")
+    return totals
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Re-encode stock_news embeddings into a compact format.")
+    parser.add_argument("--format", default=EMBEDDING_FORMAT, help="Target format: float32, int8 or list.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--reembed", action="store_true",
+                        help="Recompute missing or empty embeddings from the description.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and scan from the start.")
+    args = parser.parse_args()
+    migrate(args.format, args.batch_size, args.reembed, args.restart)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.admission import AdmissionController, AdmissionMiddleware, Rejected, _Gate
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_release_hands_the_slot_to_the_oldest_waiter():
+    async def run():
+        gate = _Gate("llm", limit=1, max_queue=4, timeout=1.0)
+        await gate.acquire()
+        order = []
+
+        async def waiter(name):
+            await gate.acquire()
+            order.append(name)
+
+        tasks = [asyncio.create_task(waiter(name)) for name in ("a", "b")]
+        await settle()
+        gate.release()
+        await settle()
+        # The slot moved to "a" without ever being free for a newcomer.
+        assert order == ["a"] and gate.active == 1
+        gate.release()
+        await asyncio.gather(*tasks)
+        assert order == ["a", "b"] and gate.active == 1
+        gate.release()
+        assert gate.active == 0 and not gate.waiters
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        gate = _Gate("llm", limit=1, max_queue=4, timeout=1.0)
+        await gate.acquire()
+        task = asyncio.create_task(gate.acquire())
+        await settle()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not gate.waiters
+        gate.release()
+        assert gate.active == 0
+
+    asyncio.run(run())
+
+
+def test_slot_handed_to_a_cancelled_waiter_is_not_lost():
+    async def run():
+        gate = _Gate("llm", limit=1, max_queue=4, timeout=1.0)
+        await gate.acquire()
+        first = asyncio.create_task(gate.acquire())
+        second = asyncio.create_task(gate.acquire())
+        await settle()
+        # Hand the slot to `first` and cancel it before it gets to run.
+        gate.release()
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        if not first.cancelled():
+            # The cancellation lost the race: `first` holds the slot and releases it as usual.
+            gate.release()
+        await asyncio.wait_for(second, 1.0)
+        gate.release()
+        assert gate.active == 0 and not gate.waiters
+
+    asyncio.run(run())
+
+
+def test_wait_past_the_deadline_is_rejected():
+    async def run():
+        gate = _Gate("llm", limit=1, max_queue=4, timeout=0.05)
+        await gate.acquire()
+        with pytest.raises(Rejected) as error:
+            await gate.acquire()
+        assert error.value.status_code == 503
+        assert not gate.waiters and gate.active == 1
+
+    asyncio.run(run())
+
+
+def test_full_queue_is_rejected_at_once():
+    async def run():
+        gate = _Gate("llm", limit=1, max_queue=1, timeout=1.0)
+        await gate.acquire()
+        queued = asyncio.create_task(gate.acquire())
+        await settle()
+        with pytest.raises(Rejected):
+            await gate.acquire()
+        gate.release()
+        await queued
+
+    asyncio.run(run())
+
+
+def scope(peer, client_id=None):
+    headers = [(b"x-client-id", client_id.encode())] if client_id else []
+    return {"type": "http", "path": "/generate", "client": (peer, 50000), "headers": headers}
+
+
+def test_client_id_header_is_ignored_from_untrusted_peers():
+    middleware = AdmissionMiddleware(None, AdmissionController(), ["/generate"])
+    assert middleware.client_id(scope("203.0.113.7", "someone-else")) == "203.0.113.7"
+
+
+def test_client_id_header_is_honoured_from_trusted_proxies():
+    middleware = AdmissionMiddleware(None, AdmissionController(), ["/generate"], trusted_proxies=["10.0.0.2"])
+    assert middleware.client_id(scope("10.0.0.2", "user-42")) == "user-42"
+    assert middleware.client_id(scope("10.0.0.2")) == "10.0.0.2"
+
+
+def test_per_client_cap_follows_the_peer_address():
+    async def run():
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await blocked.wait()
+
+        blocked = asyncio.Event()
+        controller = AdmissionController(max_per_client=1)
+        middleware = AdmissionMiddleware(app, controller, ["/generate"])
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        first = asyncio.create_task(middleware(scope("203.0.113.7", "a"), None, send))
+        await settle()
+        # A new X-Client-Id on every request does not get around the cap.
+        await middleware(scope("203.0.113.7", "b"), None, send)
+        assert sent[-2]["status"] == 429
+        blocked.set()
+        await first
+
+    asyncio.run(run())
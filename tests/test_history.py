@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "api")))
+from history import HistoryManager, message_tokens
+
+
+def make_history(turns: int, chars: int = 600):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"Câu hỏi {i}: " + "giá cổ phiếu VNM " * (chars // 17)})
+        history.append({"role": "assistant", "content": f"Trả lời {i}: " + "doanh thu quý tăng " * (chars // 19)})
+    return history
+
+
+def never_summarize(prompt):
+    raise AssertionError("cache-miss path must not wait for the summary")
+
+
+@pytest.mark.parametrize("turns", [5, 50, 200, 400])
+@pytest.mark.parametrize("reserve", [0, 4000, 11000])
+def test_cache_miss_extract_fits_budget(turns, reserve):
+    # A fresh manager has nothing cached, like a restarted or different worker.
+    manager = HistoryManager(never_summarize, max_prompt_tokens=12000)
+    manager._schedule = lambda *args: None
+    compacted = manager.compact(make_history(turns), reserve_tokens=reserve)
+    assert message_tokens(compacted) <= 12000 - reserve
+
+
+def test_extract_keeps_newest_turns_within_summary_budget():
+    manager = HistoryManager(never_summarize, keep_turns=1, max_prompt_tokens=12000, summary_words=200)
+    manager._schedule = lambda *args: None
+    compacted = manager.compact(make_history(400))
+
+    summary = compacted[0]["content"]
+    assert message_tokens([compacted[0]]) <= manager.summary_words * 2
+    assert "Trả lời 398" in summary
+    assert "Câu hỏi 0:" not in summary
+    assert compacted[-1]["content"].startswith("Trả lời 399")
+
+
+def test_build_prompt_keeps_retrieved_context():
+    # Whatever the history costs, the context reserved for the current turn survives.
+    manager = HistoryManager(never_summarize, max_prompt_tokens=12000)
+    manager._schedule = lambda *args: None
+    content_tokens = 4000
+    compacted = manager.compact(make_history(400), reserve_tokens=content_tokens)
+    assert manager.max_prompt_tokens - message_tokens(compacted) >= content_tokens
+
+
+def test_background_summary_needs_a_free_llm_slot():
+    from utils.admission import StageBudgets
+
+    async def run():
+        budgets = StageBudgets({"llm": 1})
+        manager = HistoryManager(lambda prompt: "tóm tắt", keep_turns=1,
+                                 acquire_slot=lambda: budgets.try_acquire("llm"))
+        history = make_history(5)
+
+        held = await budgets.acquire("llm")
+        manager.compact(history)
+        assert not manager._pending and not manager._cache
+
+        held.release()
+        manager.compact(history)
+        await asyncio.gather(*manager._pending.values())
+        await asyncio.sleep(0)
+        assert list(manager._cache.values()) == ["tóm tắt"]
+        assert budgets.stats()["llm"]["active"] == 0
+
+    asyncio.run(run())
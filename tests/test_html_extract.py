@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from benchmarks.fakes import LOREM
+from utils.html_extract import available_backends, extract_text
+
+BODY = "".join(f"<p>{LOREM}</p>" for _ in range(4))
+SITE_CHROME = (
+    '<header class="site-header"><a href="/">Trang chủ</a> <a href="/thi-truong">Thị trường</a></header>'
+    '<nav class="menu"><a href="/a">Chuyên mục</a></nav>'
+)
+SITE_FOOTER = '<footer class="site-footer">Bản quyền © Soni</footer>'
+
+WORDPRESS_ARTICLE = (
+    f"<html><body>{SITE_CHROME}<main><article>"
+    '<header class="entry-header"><h1>VNM lãi quý 3 tăng 12%</h1><time>19/10/2026</time></header>'
+    f'<div class="entry-content">{BODY}</div>'
+    '<footer class="entry-footer">Tác giả: Minh Anh</footer>'
+    f"</article></main>{SITE_FOOTER}</body></html>"
+)
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_article_header_kept_site_chrome_dropped(backend):
+    text = extract_text(WORDPRESS_ARTICLE, backend=backend)
+    assert "VNM lãi quý 3 tăng 12%" in text
+    assert "19/10/2026" in text
+    assert "Tác giả: Minh Anh" in text
+    assert "Trang chủ" not in text
+    assert "Chuyên mục" not in text
+    assert "Bản quyền" not in text
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_layout_wrappers_are_not_dropped(backend):
+    webforms = f'<html><body><form id="form1"><div>{BODY}</div></form></body></html>'
+    sidebar = (
+        '<html><body><div class="container has-sidebar">'
+        f'<div class="sidebar">Tin liên quan</div><div>{BODY}</div></div></body></html>'
+    )
+    assert len(extract_text(webforms, backend=backend)) > 500
+    text = extract_text(sidebar, backend=backend)
+    assert len(text) > 500 and "Tin liên quan" not in text
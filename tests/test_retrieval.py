@@ -0,0 +1,70 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.retrieval import RetrievalPlanner
+
+PAGE = "Doanh thu quý 3 của VNM tăng 12% so với cùng kỳ. " * 10
+
+
+def pool_fetch(slots: int, work_seconds: float):
+    """A fetch shaped like api.py's: waits for one of `slots` workers, then starts its deadline."""
+    semaphore = asyncio.Semaphore(slots)
+
+    async def fetch(url, deadline):
+        async with semaphore:
+            return await asyncio.wait_for(asyncio.sleep(work_seconds, PAGE), deadline.start())
+
+    return fetch
+
+
+def burst(planner, fetch, requests: int):
+    async def run():
+        return await asyncio.gather(*(
+            planner.gather([{"url": f"https://cafef.vn/bai-{i}.html", "score": 0.9}], fetch, max_chars=len(PAGE))
+            for i in range(requests)
+        ))
+    return asyncio.run(run())
+
+
+def test_queue_wait_does_not_trip_breaker():
+    # 12 requests share 2 workers: the last ones wait ~0.6s, twice the domain's timeout.
+    planner = RetrievalPlanner(default_timeout=0.3, min_timeout=0.3, failure_threshold=2)
+    results = burst(planner, pool_fetch(slots=2, work_seconds=0.1), requests=12)
+
+    stats = planner.stats()["cafef.vn"]
+    assert all(contents == [PAGE] for contents in results)
+    assert stats["failure_rate"] == 0.0
+    assert not stats["circuit_open"]
+    assert stats["latency"] < 0.3
+
+
+def test_slow_work_still_trips_breaker():
+    planner = RetrievalPlanner(default_timeout=0.3, min_timeout=0.3, failure_threshold=2)
+    results = burst(planner, pool_fetch(slots=2, work_seconds=1.0), requests=4)
+
+    assert all(contents == [] for contents in results)
+    assert planner.stats()["cafef.vn"]["circuit_open"]
+
+
+def test_queued_fetch_is_given_up_without_blame():
+    planner = RetrievalPlanner(default_timeout=0.2, min_timeout=0.2, max_queue_wait=0.1)
+    blocked = asyncio.Semaphore(0)
+
+    async def never_gets_a_worker(url, deadline):
+        async with blocked:
+            return PAGE
+
+    assert burst(planner, never_gets_a_worker, requests=3) == [[], [], []]
+    stats = planner.stats()["cafef.vn"]
+    assert stats["attempts"] == 0 and not stats["circuit_open"]
+
+
+def test_domain_stats_are_capped_least_recently_used_first():
+    planner = RetrievalPlanner(max_domains=3)
+    for domain in ["a.vn", "b.vn", "c.vn"]:
+        planner.record_fetch(domain, 0.2, True)
+    planner.allow("a.vn")
+    planner.record_fetch("d.vn", 0.2, True)
+    assert list(planner.stats()) == ["c.vn", "a.vn", "d.vn"]
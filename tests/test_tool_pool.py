@@ -0,0 +1,40 @@
+import os
+import sys
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from langchain_core.tools import tool
+
+from utils import tool_pool
+
+released = threading.Event()
+
+
+@tool
+def hung_quote(symbol: str):
+    """Never returns until the test lets it."""
+    released.wait(5)
+    return symbol
+
+
+@tool
+def quick_quote(symbol: str):
+    """Returns at once."""
+    return symbol
+
+
+def test_stuck_calls_get_a_fresh_pool(monkeypatch):
+    monkeypatch.setattr(tool_pool, "TOOL_POOL_MAX_STUCK", 2)
+    monkeypatch.setattr(tool_pool, "pool", tool_pool.Lazy(
+        lambda: tool_pool.ThreadPoolExecutor(2, thread_name_prefix="tool"), "test_tool_pool", warm=False))
+    hung = tool_pool.bounded_tool(hung_quote, timeout=0.05)
+    quick = tool_pool.bounded_tool(quick_quote, timeout=1.0)
+    try:
+        first_pool = tool_pool.pool.get()
+        assert hung.invoke({"symbol": "VNM"}) == "Error: hung_quote timed out after 0.05s"
+        assert hung.invoke({"symbol": "FPT"}).startswith("Error:")
+        # Both workers of the first pool are stuck; calls now go to a new one.
+        assert tool_pool.pool.get() is not first_pool
+        assert quick.invoke({"symbol": "HPG"}) == "HPG"
+    finally:
+        released.set()
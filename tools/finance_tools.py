@@ -1,22 +1,30 @@
-from langchain_core.tools import tool
+from langchain_core.tools import tool, StructuredTool
 from typing import Annotated
-from vnstock import Vnstock
-import pandas as pd
-import matplotlib.pyplot as plt
-import plotly.graph_objects as go
-import seaborn as sns
+import asyncio
 import os
+import sys
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from sentence_transformers import SentenceTransformer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.singleflight import get_flight
+from utils.lazy import Lazy
+from utils import db
+
+# vnstock, pandas, matplotlib, plotly, seaborn, pymongo and sentence-transformers
+# (torch) are imported where they are used so that importing this module is cheap.
 
 ############## INIT ##############
 load_dotenv()
-MONGO_URI = os.getenv("MONGODB_URI")
-client = MongoClient(MONGO_URI)
-db = client["Soni_Agent"]
-collection = db["stock_news"]
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+
+
+def _load_embedding_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+
+
+model = Lazy(_load_embedding_model, "embedding_model")
+
+quote_flight = get_flight("vnstock_quote")
 
 
 
@@ -34,9 +42,14 @@ def get_stock_data(
     
     symbol, start_date, end_date, interval = parts
     
+    df = quote_flight.do(tuple(parts), _fetch_quote_history, symbol, start_date, end_date, interval)
+    # Concurrent callers share the same frame and the plotting tools mutate it.
+    return df.copy()
+
+def _fetch_quote_history(symbol, start_date, end_date, interval):
+    from vnstock import Vnstock
     stock = Vnstock().stock(symbol=symbol, source="VCI")
-    df = stock.quote.history(start=start_date, end=end_date, interval=interval)
-    return df
+    return stock.quote.history(start=start_date, end=end_date, interval=interval)
 
 @tool 
 def get_internal_reports(symbol: Annotated[str, "The stock symbol to get internal reports for."]):
@@ -46,8 +59,7 @@ def get_internal_reports(symbol: Annotated[str, "The stock symbol to get interna
     data_report = company.reports()
     return data_report
 
-@tool
-def semantic_search_news_db(
+def _semantic_search_news_db(
     query: str,
     score_threshold: float = 0.7,
     limit: int = 3
@@ -58,54 +70,46 @@ def semantic_search_news_db(
     Args:
         query (str): Search query string.
         score_threshold (float, optional): Minimum similarity score threshold. Default is 0.7.
-        limit (int, optional): Maximum number of results. Default is 4.
+        limit (int, optional): Maximum number of results. Default is 3.
 
     Returns:
         list[str]: List of result URLs.
     """
     try:
-        query_vector = model.encode(query).tolist()
-        
-        results = collection.aggregate([
-            {"$vectorSearch": {
-                "queryVector": query_vector,
-                "path": "embedding",
-                "numCandidates": 100,
-                "limit": limit,
-                "index": "PlotSemanticSearch",
-                "scoreDetails": "similarity"
-            }},
-            {"$addFields": {
-                "score": {"$meta": "vectorSearchScore"}
-            }},
-            {"$match": {  
-                "score": {"$gte": score_threshold}
-            }},
-            {"$project": {  
-                "_id": 0,
-                "full_url": 1,
-                "score": 1
-            }}
-        ])
-        
-        sorted_results = sorted(results, key=lambda x: x["score"], reverse=True)
-        
-        urls = [doc["full_url"] for doc in sorted_results]
-        
-        
-        return urls
-    
+        query_vector = model.get().encode(query).tolist()
+        return db.search_news(query_vector, limit=limit, score_threshold=score_threshold)
+    except Exception as e:
+        return []
+
+async def _asemantic_search_news_db(
+    query: str,
+    score_threshold: float = 0.7,
+    limit: int = 3
+) -> list[str]:
+    try:
+        # Encoding is CPU-bound; keep it off the event loop like the query itself.
+        query_vector = (await asyncio.to_thread(model.get().encode, query)).tolist()
+        return await db.asearch_news(query_vector, limit=limit, score_threshold=score_threshold)
     except Exception as e:
         return []
 
+semantic_search_news_db = StructuredTool.from_function(
+    func=_semantic_search_news_db,
+    coroutine=_asemantic_search_news_db,
+    name="semantic_search_news_db",
+)
+
 
 ############## PLOTTING TOOLS ################
+# The chart agent runs several of these at once, so they draw on their own
+# matplotlib Figure objects instead of pyplot's global current figure.
 
 @tool
 def plot_volume_chart(
     symbol_and_dates: Annotated[str, "Combination of stock symbol, start date, end date, and interval separated by '|'"]
 ):
     """Plots the volume chart for a given stock symbol."""
+    from matplotlib.figure import Figure
     parts = symbol_and_dates.split('|')
     if len(parts) != 4:
         return f"Error: Invalid input format. Expected 'symbol|start_date|end_date|interval'"
@@ -114,14 +118,14 @@ def plot_volume_chart(
     
     df = get_stock_data.run(symbol_and_dates)
     
-    plt.figure(figsize=(10, 5))
-    plt.bar(df['time'], df['volume'], color='g', alpha=0.7)
-    plt.title(f'Volume Chart - {symbol}')
-    plt.xlabel('Date')
-    plt.ylabel('Volume')
-    plt.grid()
-    plt.savefig(f"{symbol}_volume_chart.png")
-    plt.close() 
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    ax.bar(df['time'], df['volume'], color='g', alpha=0.7)
+    ax.set_title(f'Volume Chart - {symbol}')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Volume')
+    ax.grid()
+    fig.savefig(f"{symbol}_volume_chart.png")
     return f"Volume chart saved as {symbol}_volume_chart.png"
 
 @tool
@@ -129,6 +133,7 @@ def plot_line_chart(
     symbol_and_dates: Annotated[str, "Combination of stock symbol, start date, end date, and interval separated by '|'"]
 ):
     """Plots the line chart for a given stock symbol."""
+    from matplotlib.figure import Figure
     parts = symbol_and_dates.split('|')
     if len(parts) != 4:
         return f"Error: Invalid input format. Expected 'symbol|start_date|end_date|interval'"
@@ -137,15 +142,15 @@ def plot_line_chart(
     
     df = get_stock_data.run(symbol_and_dates)
     
-    plt.figure(figsize=(10, 5))
-    plt.plot(df['time'], df['close'], label=symbol, color='b')
-    plt.title(f'Line Chart - {symbol}')
-    plt.xlabel('Date')
-    plt.ylabel('Close Price')
-    plt.legend()
-    plt.grid()
-    plt.savefig(f"{symbol}_line_chart.png")
-    plt.close()  
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    ax.plot(df['time'], df['close'], label=symbol, color='b')
+    ax.set_title(f'Line Chart - {symbol}')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Close Price')
+    ax.legend()
+    ax.grid()
+    fig.savefig(f"{symbol}_line_chart.png")
     return f"Line chart saved as {symbol}_line_chart.png"
 
 @tool
@@ -154,6 +159,7 @@ def plot_candlestick(
     "Example: 'VNM|2025-01-01|2025-03-27|1D'"]
 ):
     """Plots the candlestick chart for a given stock symbol."""
+    import plotly.graph_objects as go
     parts = symbol_and_dates.split('|')
     if len(parts) != 4:
         return f"Error: Invalid input format. Expected 'symbol|start_date|end_date|interval'"
@@ -180,6 +186,7 @@ def plot_volume_and_closed_price(
     "Example: 'VNM|2025-01-01|2025-03-27|1D'"]
 ):
     """Plots a combo chart with volume as bars and close price as a line."""
+    import plotly.graph_objects as go
     parts = symbol_and_dates.split('|')
     if len(parts) != 4:
         return f"Error: Invalid input format. Expected 'symbol|start_date|end_date|interval'"
@@ -224,6 +231,10 @@ def plot_volume_and_closed_price(
 @tool
 def plot_shareholders_piechart(symbol: Annotated[str, "The stock symbol to plot shareholders pie chart for."]):
     """Plots a pie chart of shareholders for a given stock symbol."""
+    import pandas as pd
+    import matplotlib
+    from matplotlib.figure import Figure
+    from vnstock import Vnstock
     company = Vnstock().stock(symbol=symbol, source="VCI").company
     shareholders_df = company.shareholders()
     
@@ -245,14 +256,15 @@ def plot_shareholders_piechart(symbol: Annotated[str, "The stock symbol to plot
 
     major_shareholders['share_own_percent'] = (major_shareholders['quantity'] / major_shareholders['quantity'].sum()) * 100
 
-    fig, ax = plt.subplots(figsize=(10, 6))
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
     explode = [0.1 if label == 'Others' else 0 for label in major_shareholders['share_holder']]
 
     ax.pie(
         major_shareholders['share_own_percent'],
         labels=major_shareholders['share_holder'],
         autopct='%1.1f%%',
-        colors=plt.cm.Paired.colors,
+        colors=matplotlib.colormaps["Paired"].colors,
         startangle=140,
         pctdistance=0.8,
         labeldistance=1.1,
@@ -260,8 +272,8 @@ def plot_shareholders_piechart(symbol: Annotated[str, "The stock symbol to plot
     )
 
     ax.set_title(f"Cổ đông lớn {symbol} ")
-    plt.savefig(f"shareholders_{symbol}_pie.png", dpi=300, bbox_inches="tight")
-    plt.close()
+    fig.savefig(f"shareholders_{symbol}_pie.png", dpi=300, bbox_inches="tight")
+    return f"Shareholders pie chart saved as shareholders_{symbol}_pie.png"
 
 
 
@@ -275,6 +287,9 @@ def plot_monthly_returns_heatmap(
     Input format: 'symbol|start_date|end_date|interval'
     Returns a saved heatmap image.
     """
+    import pandas as pd
+    import seaborn as sns
+    from matplotlib.figure import Figure
     parts = symbol_and_dates.split('|')
     if len(parts) != 4:
         return f"Error: Invalid input format. Expected 'symbol|start_date|end_date|interval'"
@@ -299,7 +314,8 @@ def plot_monthly_returns_heatmap(
         )
         
         # Set up the plot
-        plt.figure(figsize=(12, 8))
+        fig = Figure(figsize=(12, 8))
+        ax = fig.subplots()
         
         # Create heatmap
         sns.heatmap(
@@ -307,16 +323,16 @@ def plot_monthly_returns_heatmap(
             annot=True, 
             cmap='RdYlGn', 
             center=0, 
-            fmt='.2f'
+            fmt='.2f',
+            ax=ax
         )
         
-        plt.title(f'Monthly Average Returns - {symbol} ({start_date} to {end_date})', fontsize=15)
-        plt.xlabel('Month', fontsize=12)
-        plt.ylabel('Year', fontsize=12)
+        ax.set_title(f'Monthly Average Returns - {symbol} ({start_date} to {end_date})', fontsize=15)
+        ax.set_xlabel('Month', fontsize=12)
+        ax.set_ylabel('Year', fontsize=12)
         
         filename = f"{symbol}_returns_heatmap.png"
-        plt.savefig(filename, bbox_inches='tight')
-        plt.close()
+        fig.savefig(filename, bbox_inches='tight')
         
         return f"Returns heatmap saved as {filename}"
     
@@ -1,30 +1,48 @@
-from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_core.tools import tool
-from langchain_experimental.utilities import PythonREPL
 from typing import Annotated
 import os
+import sys
 import time
 import requests
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from pymongo import MongoClient
-from sentence_transformers import SentenceTransformer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.singleflight import get_flight
+from utils.html_extract import extract_text
+from utils.lazy import Lazy
 
 
 ####### INIT ##########
 load_dotenv()
 
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
+SELENIUM_PAGE_LOAD_TIMEOUT = float(os.getenv("SELENIUM_PAGE_LOAD_TIMEOUT", "20"))
+
+search_flight = get_flight("tavily")
+fetch_flight = get_flight("web_content")
 
 
 
 ####### TOOLS ##########
 
-tavily_tool = TavilySearchResults(max_results=5)
+def _make_tavily_search():
+    from langchain_community.tools.tavily_search import TavilySearchResults
+    return TavilySearchResults(max_results=5)
+
+
+tavily_search = Lazy(_make_tavily_search, "tavily_search")
+
+@tool
+def tavily_tool(query: Annotated[str, "The search query."]):
+    """Searches the web with Tavily and returns the top results with their URLs and content."""
+    return search_flight.do(("web_tools", query), tavily_search.get().invoke, query)
+
+def _make_repl():
+    from langchain_experimental.utilities import PythonREPL
+    return PythonREPL()
+
 
-repl = PythonREPL()
+repl = Lazy(_make_repl, "python_repl", warm=False)
 
 @tool
 def python_repl_tool(
@@ -32,45 +50,51 @@ def python_repl_tool(
 ):
     """Executes Python code and returns the result."""
     try:
-        result = repl.run(code)
+        result = repl.get().run(code)
         return f"Executed successfully:\n```python\n{code}\n```\nOutput: {result}"
     except Exception as e:
         return f"Execution failed. Error: {repr(e)}"
 
 
 def clean_html(html_content):
-    """Removes scripts, styles, and extracts visible text."""
-    soup = BeautifulSoup(html_content, "html.parser")
-    for script_or_style in soup(["script", "style"]):
-        script_or_style.decompose()
-    return soup.get_text(separator=" ", strip=True)
+    """Extracts the main article text, without scripts, styles or page chrome."""
+    return extract_text(html_content)
 
 
 def get_facebook_content(url, headless=True):
     """Extracts content from Facebook using Selenium."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
     options = Options()
     options.headless = headless
     options.add_argument("--disable-blink-features=AutomationControlled")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage")
 
+    driver = None
     try:
         driver = webdriver.Chrome(options=options)
+        # Bounds the call itself: a hung page would otherwise hold its worker indefinitely.
+        driver.set_page_load_timeout(SELENIUM_PAGE_LOAD_TIMEOUT)
         driver.get(url)
         time.sleep(5)
 
         page_source = driver.page_source
-        driver.quit()
-
-        soup = BeautifulSoup(page_source, "html.parser")
-        texts = [div.get_text(separator=" ", strip=True) for div in soup.find_all('div')]
-        return " ".join(texts)
+        return extract_text(page_source, main_content=False)
     except Exception as e:
         return f"Failed to fetch Facebook content: {e}"
+    finally:
+        if driver is not None:
+            driver.quit()
 
 
 def get_web_content(url):
-    """Fetches and cleans webpage content."""
+    """Fetches and cleans webpage content, sharing the fetch between concurrent callers."""
+    return fetch_flight.do(("web_tools", url), _get_web_content, url)
+
+
+def _get_web_content(url):
     try:
         response = requests.get(url, timeout=10)
         response.raise_for_status()
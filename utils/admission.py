@@ -0,0 +1,241 @@
+import asyncio
+import contextlib
+import json
+import math
+import os
+import time
+import typing as t
+from collections import deque
+
+from utils.tracing import metrics
+
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "32"))
+ADMISSION_MAX_PER_CLIENT = int(os.getenv("ADMISSION_MAX_PER_CLIENT", "4"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2.0"))
+STAGE_QUEUE_TIMEOUT = float(os.getenv("STAGE_QUEUE_TIMEOUT", "5.0"))
+# Peer addresses (e.g. the load balancer) allowed to name the client with X-Client-Id.
+ADMISSION_TRUSTED_PROXIES = [p.strip() for p in os.getenv("ADMISSION_TRUSTED_PROXIES", "").split(",") if p.strip()]
+STAGE_LIMITS = {
+    "llm": int(os.getenv("STAGE_LIMIT_LLM", "16")),
+    "selenium": int(os.getenv("STAGE_LIMIT_SELENIUM", "2")),
+}
+
+
+class Rejected(Exception):
+    """Raised when a request or stage cannot be admitted; maps to a 429/503 with Retry-After."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int = 1):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Gate:
+    """A counting semaphore with a bounded FIFO queue and a wait deadline."""
+
+    def __init__(self, name: str, limit: int, max_queue: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiters: t.Deque[asyncio.Future] = deque()
+        self.service_time = 1.0
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up, from queue length and mean service time."""
+        return max(1, math.ceil((len(self.waiters) + 1) * self.service_time / self.limit))
+
+    async def acquire(self):
+        if self.try_acquire():
+            return
+        if len(self.waiters) >= self.max_queue:
+            raise Rejected(503, f"{self.name} queue is full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            raise Rejected(503, f"timed out waiting for {self.name}", self.retry_after())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on.
+                self.release()
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def try_acquire(self) -> bool:
+        """Takes a slot only if one is free and nobody is queued for it."""
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return True
+        return False
+
+    def release(self, service_time: t.Optional[float] = None):
+        if service_time is not None:
+            self.service_time += 0.2 * (service_time - self.service_time)
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                # The slot moves straight to the next waiter; active stays the same.
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionController:
+    """Global and per-client concurrency caps in front of the expensive endpoints.
+
+    A request beyond its client's cap is rejected with 429 right away. Otherwise
+    it waits in a bounded FIFO queue for a global slot and gets a 503 when the
+    queue is full or the wait exceeds the deadline. Both carry Retry-After.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = ADMISSION_MAX_CONCURRENT,
+        max_per_client: int = ADMISSION_MAX_PER_CLIENT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+    ):
+        self.max_per_client = max_per_client
+        self._gate = _Gate("request", max_concurrent, max_queue, queue_timeout)
+        self._per_client: t.Dict[str, int] = {}
+
+    async def acquire(self, client_id: str):
+        in_flight = self._per_client.get(client_id, 0)
+        if in_flight >= self.max_per_client:
+            raise Rejected(429, "too many concurrent requests from this client", self._gate.retry_after())
+        self._per_client[client_id] = in_flight + 1
+        try:
+            await self._gate.acquire()
+        except BaseException:
+            self._release_client(client_id)
+            raise
+
+    def release(self, client_id: str, service_time: t.Optional[float] = None):
+        self._release_client(client_id)
+        self._gate.release(service_time)
+
+    def _release_client(self, client_id: str):
+        remaining = self._per_client.get(client_id, 1) - 1
+        if remaining > 0:
+            self._per_client[client_id] = remaining
+        else:
+            self._per_client.pop(client_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "active": self._gate.active,
+            "queued": len(self._gate.waiters),
+            "clients": len(self._per_client),
+            "mean_service_time": round(self._gate.service_time, 3),
+        }
+
+
+class StageBudgets:
+    """Separate concurrency budgets for expensive stages such as the LLM or Selenium."""
+
+    def __init__(self, limits: t.Dict[str, int] = None, timeout: float = STAGE_QUEUE_TIMEOUT, max_queue: int = 256):
+        limits = limits if limits is not None else STAGE_LIMITS
+        self._gates = {name: _Gate(name, limit, max_queue, timeout) for name, limit in limits.items()}
+
+    def try_acquire(self, stage: str) -> t.Optional["StageSlot"]:
+        """A slot for optional work, or None instead of queueing in front of requests."""
+        gate = self._gates[stage]
+        return StageSlot(gate) if gate.try_acquire() else None
+
+    async def acquire(self, stage: str) -> "StageSlot":
+        gate = self._gates[stage]
+        try:
+            await gate.acquire()
+        except Rejected:
+            metrics.inc("admission_rejected_total", help="Requests and stages shed by admission control.", stage=stage)
+            raise
+        return StageSlot(gate)
+
+    @contextlib.asynccontextmanager
+    async def limit(self, stage: str):
+        slot = await self.acquire(stage)
+        try:
+            yield
+        finally:
+            slot.release()
+
+    def stats(self) -> dict:
+        return {name: {"active": g.active, "queued": len(g.waiters), "limit": g.limit} for name, g in self._gates.items()}
+
+
+class StageSlot:
+    """A held stage slot; release() is idempotent so it can be called from several cleanup paths."""
+
+    def __init__(self, gate: _Gate):
+        self._gate = gate
+        self._start = time.perf_counter()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._gate.release(time.perf_counter() - self._start)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying an AdmissionController to the given paths.
+
+    The slot is held until the response body has been fully sent, so streaming
+    responses count against the limits for their whole duration. Clients are
+    identified by their peer address; the X-Client-Id header is only honoured
+    on connections from trusted_proxies, since any client can set it.
+    """
+
+    def __init__(self, app, controller: AdmissionController, paths: t.Iterable[str],
+                 trusted_proxies: t.Iterable[str] = ADMISSION_TRUSTED_PROXIES):
+        self.app = app
+        self.controller = controller
+        self.paths = set(paths)
+        self.trusted_proxies = set(trusted_proxies)
+
+    def client_id(self, scope) -> str:
+        peer = (scope.get("client") or ("unknown",))[0]
+        if peer in self.trusted_proxies:
+            headers = dict(scope.get("headers") or [])
+            return headers.get(b"x-client-id", b"").decode() or peer
+        return peer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        client_id = self.client_id(scope)
+        try:
+            await self.controller.acquire(client_id)
+        except Rejected as e:
+            metrics.inc("admission_rejected_total", help="Requests and stages shed by admission control.",
+                        stage="request", status=str(e.status_code))
+            return await send_rejection(send, e)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(client_id, time.perf_counter() - start)
+
+
+async def send_rejection(send, error: Rejected):
+    body = json.dumps({"detail": error.reason}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": error.status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(error.retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,155 @@
+import os
+import random
+import threading
+import time
+import typing as t
+from urllib.parse import urlparse
+
+from utils.tracing import metrics
+
+CRAWL_MIN_INTERVAL = float(os.getenv("CRAWL_MIN_INTERVAL", "300"))
+CRAWL_MAX_INTERVAL = float(os.getenv("CRAWL_MAX_INTERVAL", "21600"))
+CRAWL_DEFAULT_INTERVAL = float(os.getenv("CRAWL_DEFAULT_INTERVAL", "1800"))
+CRAWL_MAX_BACKOFF = float(os.getenv("CRAWL_MAX_BACKOFF", "21600"))
+CRAWL_JITTER = float(os.getenv("CRAWL_JITTER", "0.1"))
+
+
+class SectionState:
+    """Polling state of one listing page (a section of a site)."""
+
+    FIELDS = ("url", "site", "interval", "next_run", "rate", "last_run", "last_new",
+              "etag", "last_modified", "consecutive_errors", "polls", "new_total")
+
+    def __init__(self, url: str, interval: float = CRAWL_DEFAULT_INTERVAL):
+        self.url = url
+        self.site = site_of(url)
+        self.interval = interval
+        self.next_run = 0.0
+        self.rate = None  # EWMA of new articles per hour
+        self.last_run = None
+        self.last_new = None
+        self.etag = None
+        self.last_modified = None
+        self.consecutive_errors = 0
+        self.polls = 0
+        self.new_total = 0
+
+    def as_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, doc: dict) -> "SectionState":
+        state = cls(doc["url"])
+        for field in cls.FIELDS:
+            if field in doc:
+                setattr(state, field, doc[field])
+        return state
+
+
+def site_of(url: str) -> str:
+    netloc = urlparse(url).netloc.lower()
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+class CrawlScheduler:
+    """Adapts each section's poll interval to its observed new-article rate.
+
+    The interval targets about target_new new articles per poll: a section that
+    keeps publishing is polled more often, one that keeps returning nothing new
+    (or 304 Not Modified) backs off towards max_interval. Each step changes the
+    interval by at most a factor of two to damp noise. Errors back off
+    exponentially without touching the learned interval, and every wake-up time
+    gets random jitter so sections of the same site do not fire together.
+    """
+
+    def __init__(
+        self,
+        urls: t.Iterable[str],
+        min_interval: float = CRAWL_MIN_INTERVAL,
+        max_interval: float = CRAWL_MAX_INTERVAL,
+        max_backoff: float = CRAWL_MAX_BACKOFF,
+        jitter: float = CRAWL_JITTER,
+        target_new: float = 1.0,
+        alpha: float = 0.3,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.target_new = target_new
+        self.alpha = alpha
+        self._sections: t.Dict[str, SectionState] = {url: SectionState(url) for url in urls}
+        self._lock = threading.Lock()
+
+    def load(self, docs: t.Iterable[dict]):
+        """Restores persisted state for the configured sections; unknown URLs are ignored."""
+        with self._lock:
+            for doc in docs:
+                if doc.get("url") in self._sections:
+                    self._sections[doc["url"]] = SectionState.from_dict(doc)
+
+    def state(self, url: str) -> SectionState:
+        return self._sections[url]
+
+    def due(self, now: t.Optional[float] = None) -> t.List[SectionState]:
+        """Sections whose next_run has passed, most overdue first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            due = [s for s in self._sections.values() if s.next_run <= now]
+        return sorted(due, key=lambda s: s.next_run)
+
+    def next_wakeup(self, exclude: t.Container[str] = ()) -> float:
+        """Earliest next_run among sections not in exclude (e.g. those being polled right now)."""
+        with self._lock:
+            runs = [s.next_run for url, s in self._sections.items() if url not in exclude]
+        return min(runs, default=time.time() + self.max_interval)
+
+    def _clamp(self, interval: float) -> float:
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def _schedule(self, state: SectionState, delay: float, now: float):
+        delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        state.next_run = now + delay
+
+    def record_success(self, url: str, new_count: int, now: t.Optional[float] = None):
+        """A poll finished; new_count is 0 for unchanged or 304 Not Modified pages."""
+        now = time.time() if now is None else now
+        state = self._sections[url]
+        with self._lock:
+            elapsed = now - state.last_run if state.last_run else state.interval
+            observed = new_count * 3600 / max(elapsed, 1.0)
+            state.rate = observed if state.rate is None else state.rate + self.alpha * (observed - state.rate)
+            if state.rate > 0:
+                target = self.target_new * 3600 / state.rate
+            else:
+                target = state.interval * 2
+            # Nothing new this time means we polled too early, whatever the average says.
+            if new_count == 0:
+                target = max(target, state.interval * 1.25)
+            state.interval = self._clamp(min(state.interval * 2, max(state.interval / 2, target)))
+            state.last_run = now
+            state.polls += 1
+            state.consecutive_errors = 0
+            if new_count:
+                state.last_new = now
+                state.new_total += new_count
+            self._schedule(state, state.interval, now)
+        metrics.inc("crawl_polls_total", help="Section polls by site and outcome.",
+                    site=state.site, outcome="new" if new_count else "unchanged")
+        if new_count:
+            metrics.inc("crawl_new_articles_total", new_count, help="New articles found by site.", site=state.site)
+
+    def record_error(self, url: str, now: t.Optional[float] = None):
+        now = time.time() if now is None else now
+        state = self._sections[url]
+        with self._lock:
+            state.consecutive_errors += 1
+            state.last_run = now
+            state.polls += 1
+            delay = min(self.max_backoff, self.min_interval * 2 ** state.consecutive_errors)
+            self._schedule(state, delay, now)
+        metrics.inc("crawl_polls_total", help="Section polls by site and outcome.", site=state.site, outcome="error")
+
+    def stats(self) -> t.Dict[str, dict]:
+        with self._lock:
+            return {url: s.as_dict() for url, s in self._sections.items()}
@@ -0,0 +1,249 @@
+"""Shared MongoDB access for the news search tools and the crawler.
+
+One pooled client per process (sync and async), projection-only reads,
+server-side sorting and bulk writes. Set MONGODB_URI=mongomock:// to run
+against an in-memory mongomock backend, e.g. in tests and benchmarks.
+"""
+import asyncio
+import os
+import typing as t
+
+from dotenv import load_dotenv
+
+from utils.embeddings import decode_embedding, encode_embedding
+from utils.lazy import Lazy
+
+load_dotenv()
+MONGO_URI = os.getenv("MONGODB_URI")
+MONGO_DB = os.getenv("MONGODB_DB", "Soni_Agent")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "2"))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", "60000"))
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", "5000"))
+NEWS_VECTOR_INDEX = os.getenv("NEWS_VECTOR_INDEX", "PlotSemanticSearch")
+
+NEWS = "stock_news"
+CONFIGS = "configs"
+CRAWL_SCHEDULE = "crawl_schedule"
+
+MOCK_SCHEME = "mongomock://"
+
+
+def is_mock() -> bool:
+    return (MONGO_URI or "").startswith(MOCK_SCHEME)
+
+
+def _client_options() -> dict:
+    return {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_MS,
+        "serverSelectionTimeoutMS": MONGO_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_TIMEOUT_MS,
+        "retryWrites": True,
+    }
+
+
+def _make_client():
+    if is_mock():
+        import mongomock
+        return mongomock.MongoClient()
+    from pymongo import MongoClient
+    return MongoClient(MONGO_URI, **_client_options())
+
+
+def _make_async_client():
+    if is_mock():
+        # Same in-memory data as the sync client, served from a worker thread.
+        return _ThreadedAsyncClient(client.get())
+    try:
+        from pymongo import AsyncMongoClient
+    except ImportError:
+        from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+    return AsyncMongoClient(MONGO_URI, **_client_options())
+
+
+client = Lazy(_make_client, "mongo_client")
+async_client = Lazy(_make_async_client, "mongo_async_client", warm=False)
+
+
+def collection(name: str = NEWS):
+    return client.get()[MONGO_DB][name]
+
+
+def async_collection(name: str = NEWS):
+    return async_client.get()[MONGO_DB][name]
+
+
+def ensure_indexes():
+    """Unique full_url (dedup and upserts) and post_time (recency queries) on stock_news, url on crawl_schedule."""
+    news = collection(NEWS)
+    news.create_index("full_url", unique=True)
+    news.create_index([("post_time", -1)])
+    collection(CRAWL_SCHEDULE).create_index("url", unique=True)
+
+
+############## NEWS SEARCH ##############
+
+def news_search_pipeline(query_vector: t.List[float], limit: int, score_threshold: float,
+                         num_candidates: int = 100) -> t.List[dict]:
+    return [
+        {"$vectorSearch": {
+            # Same encoding as the stored vectors (binary float32/int8 or legacy list).
+            "queryVector": encode_embedding(query_vector),
+            "path": "embedding",
+            "numCandidates": num_candidates,
+            "limit": limit,
+            "index": NEWS_VECTOR_INDEX,
+        }},
+        {"$project": {"_id": 0, "full_url": 1, "score": {"$meta": "vectorSearchScore"}}},
+        {"$match": {"score": {"$gte": score_threshold}}},
+        {"$sort": {"score": -1}},
+    ]
+
+
+def search_news(query_vector: t.List[float], limit: int = 3, score_threshold: float = 0.7) -> t.List[str]:
+    """URLs of the stock_news articles closest to query_vector, best first."""
+    news = collection(NEWS)
+    if is_mock():
+        return _local_vector_search(news.find(*_EMBEDDED_ONLY), query_vector, limit, score_threshold)
+    return [doc["full_url"] for doc in news.aggregate(news_search_pipeline(query_vector, limit, score_threshold))]
+
+
+async def asearch_news(query_vector: t.List[float], limit: int = 3, score_threshold: float = 0.7) -> t.List[str]:
+    """Non-blocking search_news() for code running on an event loop."""
+    news = async_collection(NEWS)
+    if is_mock():
+        docs = await _to_list(news.find(*_EMBEDDED_ONLY))
+        return _local_vector_search(docs, query_vector, limit, score_threshold)
+    docs = await _to_list(news.aggregate(news_search_pipeline(query_vector, limit, score_threshold)))
+    return [doc["full_url"] for doc in docs]
+
+
+# mongomock has no $vectorSearch: scan the embedded documents instead.
+_EMBEDDED_ONLY = ({"embedding": {"$exists": True, "$ne": []}}, {"_id": 0, "full_url": 1, "embedding": 1})
+
+
+def _local_vector_search(docs, query_vector, limit, score_threshold) -> t.List[str]:
+    import numpy as np
+
+    docs = list(docs)
+    if not docs:
+        return []
+    matrix = np.stack([decode_embedding(doc["embedding"]) for doc in docs])
+    query = np.asarray(query_vector, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    cosine = matrix @ query / np.where(norms == 0, 1, norms)
+    # Atlas reports cosine similarity normalized to [0, 1].
+    scores = (1 + cosine) / 2
+    order = np.argsort(-scores)[:limit]
+    return [docs[i]["full_url"] for i in order if scores[i] >= score_threshold]
+
+
+############## CRAWLER WRITES ##############
+
+def known_urls(urls: t.Iterable[str]) -> t.Set[str]:
+    """The subset of urls already stored, fetched in one projected query."""
+    urls = list(urls)
+    if not urls:
+        return set()
+    cursor = collection(NEWS).find({"full_url": {"$in": urls}}, {"_id": 0, "full_url": 1})
+    return {doc["full_url"] for doc in cursor}
+
+
+def bulk_insert_news(docs: t.List[dict]) -> int:
+    """Inserts articles not stored yet (keyed by full_url) in one unordered bulk write."""
+    updates = [({"full_url": doc["full_url"]}, {"$setOnInsert": doc}) for doc in docs]
+    return bulk_update(NEWS, updates, upsert=True)["upserted"]
+
+
+def bulk_update(name: str, updates: t.List[tuple], upsert: bool = False) -> dict:
+    """Applies (filter, update) pairs in one unordered bulk write; returns matched/modified/upserted counts."""
+    from pymongo import UpdateOne
+
+    counts = {"matched": 0, "modified": 0, "upserted": 0}
+    if not updates:
+        return counts
+    coll = collection(name)
+    if is_mock():
+        # mongomock cannot consume UpdateOne from recent pymongo releases.
+        for query, update in updates:
+            result = coll.update_one(query, update, upsert=upsert)
+            counts["matched"] += result.matched_count
+            counts["modified"] += result.modified_count
+            counts["upserted"] += result.upserted_id is not None
+        return counts
+    result = coll.bulk_write([UpdateOne(query, update, upsert=upsert) for query, update in updates], ordered=False)
+    return {"matched": result.matched_count, "modified": result.modified_count, "upserted": result.upserted_count}
+
+
+def get_config(name: str, default=None):
+    doc = collection(CONFIGS).find_one({"name": name}, {"_id": 0, "value": 1, "timestamp": 1})
+    if not doc:
+        return default
+    return doc.get("value", doc.get("timestamp", default))
+
+
+def set_config(name: str, value):
+    collection(CONFIGS).update_one({"name": name}, {"$set": {"value": value}}, upsert=True)
+
+
+async def aload_crawl_states() -> t.List[dict]:
+    return await _to_list(async_collection(CRAWL_SCHEDULE).find({}, {"_id": 0}))
+
+
+async def asave_crawl_state(state: dict):
+    await async_collection(CRAWL_SCHEDULE).update_one({"url": state["url"]}, {"$set": state}, upsert=True)
+
+
+############## ASYNC HELPERS ##############
+
+async def _to_list(cursor_or_awaitable):
+    """Lists a cursor from pymongo's async client, Motor or the mongomock wrapper."""
+    cursor = cursor_or_awaitable
+    if asyncio.iscoroutine(cursor) or isinstance(cursor, asyncio.Future):
+        cursor = await cursor
+    return await cursor.to_list(None)
+
+
+class _ListCursor:
+    def __init__(self, fn, *args, **kwargs):
+        self._call = (fn, args, kwargs)
+
+    async def to_list(self, length=None):
+        fn, args, kwargs = self._call
+        docs = await asyncio.to_thread(lambda: list(fn(*args, **kwargs)))
+        return docs if length is None else docs[:length]
+
+
+class _ThreadedAsyncCollection:
+    """Async facade over a sync (mongomock) collection for the methods this repo uses."""
+
+    def __init__(self, sync_collection):
+        self._sync = sync_collection
+
+    def find(self, *args, **kwargs):
+        return _ListCursor(self._sync.find, *args, **kwargs)
+
+    def aggregate(self, *args, **kwargs):
+        return _ListCursor(self._sync.aggregate, *args, **kwargs)
+
+    def __getattr__(self, name):
+        method = getattr(self._sync, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return call
+
+
+class _ThreadedAsyncClient:
+    def __init__(self, sync_client):
+        self._sync = sync_client
+
+    def __getitem__(self, db_name):
+        sync_db = self._sync[db_name]
+
+        class _Db:
+            def __getitem__(self, name):
+                return _ThreadedAsyncCollection(sync_db[name])
+        return _Db()
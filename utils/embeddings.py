@@ -0,0 +1,56 @@
+"""Compact storage format for the stock_news embedding field.
+
+Embeddings are stored as BSON binary vectors (subtype 9) instead of arrays of
+doubles, tagged with embedding_v so readers and the migration job can tell the
+formats apart. Documents without an embedding_v tag hold the legacy list.
+"""
+import os
+
+import numpy as np
+
+# float32: 4 bytes/dim, exact for the model's output. int8: 1 byte/dim, scalar
+# quantized (the vectors are unit-normalized, so cosine ranking barely moves).
+EMBEDDING_FORMAT = os.getenv("EMBEDDING_FORMAT", "float32")
+
+LEGACY_VERSION = 1
+VERSIONS = {"list": 1, "float32": 2, "int8": 3}
+
+
+def version_of(fmt: str = EMBEDDING_FORMAT) -> int:
+    if fmt not in VERSIONS:
+        raise ValueError(f"Unknown EMBEDDING_FORMAT {fmt!r}, expected one of {sorted(VERSIONS)}")
+    return VERSIONS[fmt]
+
+
+def encode_embedding(vector, fmt: str = EMBEDDING_FORMAT):
+    """Encodes a vector in the storage format; this is also the form $vectorSearch queries use."""
+    from bson.binary import Binary, BinaryVectorDtype
+
+    version = version_of(fmt)
+    array = np.asarray(vector, dtype=np.float32)
+    if version == 1:
+        return array.tolist()
+    if version == 3:
+        # Clipped for safety; the sentence-transformers model already normalizes.
+        quantized = np.clip(np.rint(array * 127), -127, 127).astype(np.int8)
+        return Binary.from_vector(quantized.tolist(), BinaryVectorDtype.INT8)
+    return Binary.from_vector(array.tolist(), BinaryVectorDtype.FLOAT32)
+
+
+def embedding_fields(vector, fmt: str = EMBEDDING_FORMAT) -> dict:
+    """Fields to $set on a news document; empty when there is nothing to index."""
+    if vector is None or len(vector) == 0:
+        return {}
+    return {"embedding": encode_embedding(vector, fmt), "embedding_v": version_of(fmt)}
+
+
+def decode_embedding(value) -> np.ndarray:
+    """A float32 numpy vector from any stored format (legacy list or binary vector)."""
+    from bson.binary import Binary
+
+    if isinstance(value, Binary):
+        # Binary vectors carry a 2-byte header: dtype and padding.
+        dtype = np.int8 if value[0] == 0x03 else np.float32
+        array = np.frombuffer(value, dtype=dtype, offset=2).astype(np.float32)
+        return array / 127 if dtype is np.int8 else array
+    return np.asarray(value, dtype=np.float32)
@@ -0,0 +1,265 @@
+"""HTML to text extraction with boilerplate removal and main-content detection.
+
+Backends are tried in order of speed: selectolax (lexbor), lxml, then BeautifulSoup.
+Pick one explicitly with HTML_EXTRACT_BACKEND.
+"""
+import os
+import re
+import typing as t
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    etree = lxml_html = None
+
+EXTRACT_MAX_CHARS = int(os.getenv("EXTRACT_MAX_CHARS", "8000"))
+HTML_EXTRACT_BACKEND = os.getenv("HTML_EXTRACT_BACKEND")
+
+# Never content: dropped in every mode.
+JUNK_TAGS = ("script", "style", "noscript", "template", "iframe", "svg", "canvas")
+# Page chrome: dropped when looking for the main content.
+# No "form": ASP.NET WebForms pages wrap the whole body in <form id="form1">.
+BOILERPLATE_TAGS = ("nav", "aside", "button", "select")
+BOILERPLATE_ATTR = re.compile(
+    r"(?:^|[\s_-])(?:nav|navbar|menu|sidebar|breadcrumbs?|comments?|share|social|related|"
+    r"advert|ads?|banner|cookie|popup|modal|subscribe|newsletter|widget|tags?)(?:$|[\s_-])",
+    re.IGNORECASE,
+)
+# Site header/footer are chrome, but inside an article or main element they hold the
+# headline, publish date and byline (<header class="entry-header"> on WordPress).
+SECTION_TAGS = ("header", "footer")
+SECTION_ATTR = re.compile(r"(?:^|[\s_-])(?:header|footer)(?:$|[\s_-])", re.IGNORECASE)
+PROTECTED_TAGS = {"html", "body", "main", "article"}
+MAIN_SELECTOR = "article, main, [itemprop=articleBody], [role=main]"
+MAIN_XPATH = "//article | //main | //*[@itemprop='articleBody'] | //*[@role='main']"
+MIN_MAIN_CHARS = 200
+# A boilerplate-looking element holding more than this share of the body text is
+# the page layout itself (e.g. class="container has-sidebar") and is kept.
+MAX_BOILERPLATE_SHARE = 0.5
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def available_backends() -> t.List[str]:
+    backends = []
+    if LexborHTMLParser is not None:
+        backends.append("selectolax")
+    if lxml_html is not None:
+        backends.append("lxml")
+    backends.append("bs4")
+    return backends
+
+
+def extract_text(
+    html: t.Union[str, bytes],
+    main_content: bool = True,
+    max_chars: t.Optional[int] = EXTRACT_MAX_CHARS,
+    backend: t.Optional[str] = None,
+) -> str:
+    """Returns the visible text of a page, whitespace-collapsed and capped at max_chars.
+
+    With main_content, navigation/footer/sidebar blocks are removed and the text is
+    taken from the article body (semantic tags first, paragraph density otherwise).
+    Without it the whole document text is returned once, with no per-block repeats.
+    If main-content detection leaves less than MIN_MAIN_CHARS, the whole document
+    text is returned instead.
+    """
+    if not html:
+        return ""
+    backend = backend or HTML_EXTRACT_BACKEND or available_backends()[0]
+    extractor = _EXTRACTORS.get(backend)
+    if extractor is None:
+        raise ValueError(f"Unknown HTML extraction backend: {backend}")
+    text = _WHITESPACE.sub(" ", extractor(html, main_content)).strip()
+    if main_content and len(text) < MIN_MAIN_CHARS:
+        text = _WHITESPACE.sub(" ", extractor(html, False)).strip()
+    return truncate(text, max_chars)
+
+
+def truncate(text: str, max_chars: t.Optional[int]) -> str:
+    """Cuts text to max_chars at the last word boundary."""
+    if not max_chars or len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    space = cut.rfind(" ")
+    return cut[:space] if space > max_chars * 0.8 else cut
+
+
+def _is_boilerplate(tag: str, attrs: str, in_main: t.Callable[[], bool]) -> bool:
+    """in_main is only called for header/footer candidates: it walks the ancestors."""
+    if tag in PROTECTED_TAGS:
+        return False
+    if tag in BOILERPLATE_TAGS or BOILERPLATE_ATTR.search(attrs):
+        return True
+    if tag in SECTION_TAGS or SECTION_ATTR.search(attrs):
+        return not in_main()
+    return False
+
+
+def _is_main(tag: str, itemprop: t.Optional[str], role: t.Optional[str]) -> bool:
+    return tag in ("article", "main") or itemprop == "articleBody" or role == "main"
+
+
+def _holds_most(length: int, total: int) -> bool:
+    return total > 0 and length > total * MAX_BOILERPLATE_SHARE
+
+
+############## SELECTOLAX ##############
+
+def _extract_selectolax(html, main_content):
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(list(JUNK_TAGS))
+    root = tree.body or tree.root
+    if root is None:
+        return ""
+    if not main_content:
+        return root.text(separator=" ", strip=True)
+
+    total = len(root.text(strip=True))
+    marked = [
+        node for node in root.css(", ".join(BOILERPLATE_TAGS + SECTION_TAGS + ("[class]", "[id]")))
+        if _is_boilerplate(node.tag, f"{node.attributes.get('class') or ''} {node.attributes.get('id') or ''}",
+                           lambda node=node: _selectolax_in_main(node))
+        and not _holds_most(len(node.text(strip=True)), total)
+    ]
+    # Decompose outermost matches only; descendants go with them.
+    marked_ids = {node.mem_id for node in marked}
+    for node in marked:
+        parent, nested = node.parent, False
+        while parent is not None:
+            if parent.mem_id in marked_ids:
+                nested = True
+                break
+            parent = parent.parent
+        if not nested:
+            node.decompose()
+    for node in marked:
+        marked_ids.discard(node.mem_id)
+
+    best, best_len = None, 0
+    for node in root.css(MAIN_SELECTOR):
+        length = len(node.text(strip=True))
+        if length > best_len:
+            best, best_len = node, length
+    if best is None or best_len < MIN_MAIN_CHARS:
+        scores, nodes = {}, {}
+        for p in root.css("p"):
+            parent = p.parent
+            if parent is None:
+                continue
+            scores[parent.mem_id] = scores.get(parent.mem_id, 0) + len(p.text(strip=True))
+            nodes[parent.mem_id] = parent
+        if scores:
+            mem_id = max(scores, key=scores.get)
+            if scores[mem_id] >= MIN_MAIN_CHARS:
+                best = nodes[mem_id]
+    return (best or root).text(separator=" ", strip=True)
+
+
+def _selectolax_in_main(node):
+    parent = node.parent
+    while parent is not None:
+        attrs = parent.attributes
+        if _is_main(parent.tag, attrs.get("itemprop"), attrs.get("role")):
+            return True
+        parent = parent.parent
+    return False
+
+
+############## LXML ##############
+
+def _extract_lxml(html, main_content):
+    if isinstance(html, str):
+        # lxml rejects str input that carries an XML encoding declaration.
+        html = html.encode("utf-8")
+    try:
+        root = lxml_html.fromstring(html, parser=lxml_html.HTMLParser(encoding="utf-8", remove_comments=True))
+    except etree.ParserError:
+        return ""
+    for el in list(root.iter(*JUNK_TAGS)):
+        el.drop_tree()
+    body = root.find("body")
+    if body is None:
+        body = root
+    if not main_content:
+        return _lxml_text(body)
+
+    total = len(_lxml_text(body))
+    for el in list(body.iterdescendants()):
+        if not isinstance(el.tag, str) or el.getparent() is None:
+            continue
+        if _is_boilerplate(el.tag, f"{el.get('class', '')} {el.get('id', '')}",
+                           lambda el=el: any(_is_main(a.tag, a.get("itemprop"), a.get("role")) for a in el.iterancestors())) \
+                and not _holds_most(len(_lxml_text(el)), total):
+            el.drop_tree()
+
+    best, best_len = None, 0
+    for el in body.xpath(MAIN_XPATH):
+        length = len(_lxml_text(el))
+        if length > best_len:
+            best, best_len = el, length
+    if best is None or best_len < MIN_MAIN_CHARS:
+        scores = {}
+        for p in body.iter("p"):
+            parent = p.getparent()
+            if parent is not None:
+                scores[parent] = scores.get(parent, 0) + len(_lxml_text(p))
+        if scores:
+            candidate = max(scores, key=scores.get)
+            if scores[candidate] >= MIN_MAIN_CHARS:
+                best = candidate
+    return _lxml_text(best if best is not None else body)
+
+
+def _lxml_text(el):
+    return " ".join(s.strip() for s in el.itertext() if s.strip())
+
+
+############## BEAUTIFULSOUP ##############
+
+def _extract_bs4(html, main_content):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "lxml" if lxml_html is not None else "html.parser")
+    for el in soup(JUNK_TAGS):
+        el.decompose()
+    body = soup.body or soup
+    if not main_content:
+        return body.get_text(separator=" ", strip=True)
+
+    total = len(body.get_text(strip=True))
+    for el in body.find_all(True):
+        if el.decomposed:
+            continue
+        attrs = " ".join(el.get("class", [])) + " " + (el.get("id") or "")
+        in_main = lambda el=el: any(_is_main(p.name, p.get("itemprop"), p.get("role")) for p in el.parents)
+        if _is_boilerplate(el.name, attrs, in_main) and not _holds_most(len(el.get_text(strip=True)), total):
+            el.decompose()
+
+    best, best_len = None, 0
+    for el in body.select(MAIN_SELECTOR):
+        length = len(el.get_text(strip=True))
+        if length > best_len:
+            best, best_len = el, length
+    if best is None or best_len < MIN_MAIN_CHARS:
+        scores = {}
+        for p in body.find_all("p"):
+            if p.parent is not None:
+                scores[id(p.parent)] = (scores.get(id(p.parent), (0, p.parent))[0] + len(p.get_text(strip=True)), p.parent)
+        if scores:
+            score, candidate = max(scores.values(), key=lambda item: item[0])
+            if score >= MIN_MAIN_CHARS:
+                best = candidate
+    return (best or body).get_text(separator=" ", strip=True)
+
+
+_EXTRACTORS = {
+    "selectolax": _extract_selectolax,
+    "lxml": _extract_lxml,
+    "bs4": _extract_bs4,
+}
@@ -0,0 +1,67 @@
+import logging
+import threading
+import time
+import typing as t
+
+logger = logging.getLogger(__name__)
+
+T = t.TypeVar("T")
+
+_registry: t.List["Lazy"] = []
+_registry_lock = threading.Lock()
+
+
+class Lazy(t.Generic[T]):
+    """A process-wide resource built on first use, at most once, from any thread.
+
+    Heavy imports belong inside the factory so that importing the module that
+    declares the resource stays cheap. Resources created with warm=True are
+    built ahead of traffic by warm_up().
+    """
+
+    def __init__(self, factory: t.Callable[[], T], name: str, warm: bool = True):
+        self.factory = factory
+        self.name = name
+        self.warm = warm
+        self._value: t.Optional[T] = None
+        self._ready = False
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def get(self) -> T:
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    start = time.perf_counter()
+                    self._value = self.factory()
+                    self._ready = True
+                    logger.info("Initialized %s in %.2fs", self.name, time.perf_counter() - start)
+        return self._value
+
+    @property
+    def initialized(self) -> bool:
+        return self._ready
+
+    def reset(self):
+        """Drops the built value, e.g. in a forked child that must not share it."""
+        with self._lock:
+            self._value = None
+            self._ready = False
+
+
+def warm_up(names: t.Optional[t.Iterable[str]] = None) -> t.Dict[str, float]:
+    """Builds registered resources (all warm ones, or the given names) and returns seconds spent on each."""
+    wanted = set(names) if names is not None else None
+    with _registry_lock:
+        resources = [r for r in _registry if (r.name in wanted if wanted is not None else r.warm)]
+    timings = {}
+    for resource in resources:
+        start = time.perf_counter()
+        try:
+            resource.get()
+        except Exception as e:
+            logger.warning("Warm-up of %s failed: %s", resource.name, e)
+            continue
+        timings[resource.name] = time.perf_counter() - start
+    return timings
@@ -0,0 +1,135 @@
+import os
+import re
+import threading
+import typing as t
+
+from utils.tracing import metrics
+
+TIERS = ("fast", "large")
+
+# USD per 1k tokens (input, output), matched as a substring of the configured model
+# name (e.g. "vertex_ai/gemini-1.5-flash-002"). Gemini 1.5 Flash / Pro list prices.
+KNOWN_PRICES = {
+    "gemini-1.5-flash": (0.000075, 0.0003),
+    "gemini-1.5-pro": (0.00125, 0.005),
+}
+
+# Signals that a question needs reasoning over several facts rather than a lookup.
+COMPLEX_PATTERNS = re.compile(
+    r"\b(so sánh|phân tích|đánh giá|tại sao|vì sao|giải thích|tổng hợp|dự báo|nhận định|chiến lược|"
+    r"ưu nhược|khác nhau|compare|analy[sz]e|explain|why|summari[sz]e|forecast|pros and cons)\b",
+    re.IGNORECASE,
+)
+# Phrases a fast model uses when it could not answer from the context.
+UNSURE_PATTERNS = re.compile(
+    r"(không biết|không có thông tin|không tìm thấy|không rõ|chưa có thông tin|không thể trả lời|"
+    r"i don't know|i do not know|no information|cannot answer|not sure)",
+    re.IGNORECASE,
+)
+
+
+def price_for_model(model: t.Optional[str]) -> t.Optional[tuple]:
+    for name, price in KNOWN_PRICES.items():
+        if model and name in model:
+            return price
+    return None
+
+
+def classify_query(query: str, context_chars: int = 0) -> str:
+    """Picks a tier from the question alone: short lookups go to the fast model."""
+    words = len(query.split())
+    questions = query.count("?")
+    if COMPLEX_PATTERNS.search(query) or words > 40 or questions > 1 or context_chars > 20000:
+        return "large"
+    return "fast"
+
+
+def looks_unsure(answer: t.Optional[str], min_chars: int = 40) -> bool:
+    """True when an answer is empty, very short or hedges; used to escalate to the large tier."""
+    if not answer or len(answer.strip()) < min_chars:
+        return True
+    return bool(UNSURE_PATTERNS.search(answer[:500]))
+
+
+class TierPolicy:
+    """Maps components (graph nodes, endpoints) to model tiers and reports usage per tier.
+
+    Each component has a default tier; MODEL_TIER_<COMPONENT> overrides it with
+    "fast", "large" or "auto" (classify the query). Escalations from fast to
+    large are counted, and the cost saving is reported against running every
+    call on the large tier's model.
+
+    Prices are per model, not per tier: when both tiers point at the same model
+    there is no saving. Models without a known price (or MODEL_PRICE_<TIER>_INPUT
+    and _OUTPUT) report cost and savings as None.
+    """
+
+    def __init__(self, models: t.Dict[str, str], defaults: t.Dict[str, str], prices: t.Dict[str, tuple] = None):
+        self.models = models
+        self.defaults = defaults
+        if prices is None:
+            prices = {}
+            # "large" comes last, so its override wins when both tiers share a model.
+            for tier in TIERS:
+                model = models.get(tier)
+                price = price_for_model(model)
+                price_in = os.getenv(f"MODEL_PRICE_{tier.upper()}_INPUT")
+                price_out = os.getenv(f"MODEL_PRICE_{tier.upper()}_OUTPUT")
+                if price_in is not None and price_out is not None:
+                    price = (float(price_in), float(price_out))
+                if model and price is not None:
+                    prices[model] = price
+        self.prices = prices
+        self._lock = threading.Lock()
+        self._stats = {tier: {"calls": 0, "escalations": 0, "seconds": 0.0, "prompt_tokens": 0,
+                              "completion_tokens": 0} for tier in TIERS}
+
+    def tier_for(self, component: str, query: t.Optional[str] = None, context_chars: int = 0) -> str:
+        tier = os.getenv(f"MODEL_TIER_{component.upper()}", self.defaults.get(component, "large"))
+        if tier == "auto":
+            tier = classify_query(query or "", context_chars)
+        return tier if tier in TIERS else "large"
+
+    def model_for(self, component: str, query: t.Optional[str] = None, context_chars: int = 0) -> t.Tuple[str, str]:
+        tier = self.tier_for(component, query, context_chars)
+        return tier, self.models[tier]
+
+    def escalate(self, component: str, tier: str) -> t.Tuple[str, str]:
+        """Returns the next tier up (and counts the escalation)."""
+        with self._lock:
+            self._stats[tier]["escalations"] += 1
+        metrics.inc("model_tier_escalations_total", help="Calls retried on a larger model tier.",
+                    component=component, tier=tier)
+        return "large", self.models["large"]
+
+    def record(self, component: str, tier: str, seconds: float, prompt_tokens: int = 0, completion_tokens: int = 0):
+        with self._lock:
+            stats = self._stats[tier]
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+        metrics.observe("model_tier_seconds", seconds, help="LLM call latency by tier and component.",
+                        tier=tier, component=component)
+
+    def _cost(self, model: t.Optional[str], prompt_tokens: int, completion_tokens: int) -> t.Optional[float]:
+        if model not in self.prices:
+            return None
+        price_in, price_out = self.prices[model]
+        return prompt_tokens / 1000 * price_in + completion_tokens / 1000 * price_out
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = {tier: dict(values) for tier, values in self._stats.items()}
+        report = {}
+        for tier, s in snapshot.items():
+            cost = self._cost(self.models.get(tier), s["prompt_tokens"], s["completion_tokens"])
+            large_cost = self._cost(self.models.get("large"), s["prompt_tokens"], s["completion_tokens"])
+            report[tier] = {
+                **s,
+                "model": self.models.get(tier),
+                "mean_seconds": s["seconds"] / s["calls"] if s["calls"] else None,
+                "cost_usd": round(cost, 6) if cost is not None else None,
+                "saved_vs_large_usd": round(large_cost - cost, 6) if None not in (cost, large_cost) else None,
+            }
+        return report
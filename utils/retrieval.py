@@ -0,0 +1,297 @@
+import asyncio
+import os
+import threading
+import time
+import typing as t
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from utils.admission import Rejected
+from utils.tracing import metrics
+
+CONTEXT_MAX_CHARS = int(os.getenv("CONTEXT_MAX_CHARS", "12000"))
+FETCH_PARALLELISM = int(os.getenv("FETCH_PARALLELISM", "3"))
+# Domains whose stats are kept; search results name an open-ended set of sites.
+RETRIEVAL_MAX_DOMAINS = int(os.getenv("RETRIEVAL_MAX_DOMAINS", "2048"))
+
+# Failed fetches in api/api.py and tools/web_tools.py come back as text, not exceptions.
+ERROR_PREFIXES = ("Error fetching content", "Failed to fetch")
+
+
+class DomainStats:
+    """Exponentially weighted health of one domain."""
+
+    def __init__(self):
+        self.latency = None
+        self.failure_rate = 0.0
+        self.usefulness = 0.5
+        self.attempts = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "latency": self.latency,
+            "failure_rate": round(self.failure_rate, 3),
+            "usefulness": round(self.usefulness, 3),
+            "attempts": self.attempts,
+            "circuit_open": self.open_until > time.time(),
+        }
+
+
+class Deadline:
+    """The timeout of one fetch, counted from when its work starts rather than from launch.
+
+    gather() calls fetch(url, deadline). Waiting for a slot in our own pools or
+    stage budgets is load on this process, not slowness of the domain, so the
+    fetch calls deadline.start() once it has its worker and applies the returned
+    timeout from there, raising asyncio.TimeoutError when it expires.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.started: t.Optional[float] = None
+
+    def start(self) -> float:
+        if self.started is None:
+            self.started = time.perf_counter()
+        return self.timeout
+
+
+class RetrievalPlanner:
+    """Orders, prunes and fetches candidate URLs using per-domain health.
+
+    Domains are ranked by search score, how often their pages ended up in the
+    final context, failure rate and latency. A domain whose fetches keep failing
+    is skipped until its circuit breaker cools down. Fetches get a per-domain
+    timeout derived from observed latency; if every in-flight fetch is slower
+    than expected, the next candidate is started as a hedge. Fetching stops as
+    soon as enough text has been collected to fill the context. A fetch still
+    waiting for a local worker max_queue_wait seconds past its timeout is given up
+    without counting against the domain. Stats are kept for the max_domains most
+    recently seen domains.
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.3,
+        failure_threshold: int = 3,
+        cooldown: float = 300.0,
+        default_timeout: float = 5.0,
+        min_timeout: float = 1.5,
+        max_timeout: float = 15.0,
+        min_chars: int = 200,
+        max_hedges: int = 2,
+        max_queue_wait: float = 10.0,
+        max_domains: int = RETRIEVAL_MAX_DOMAINS,
+        expensive_domains: t.Dict[str, float] = None,
+    ):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_chars = min_chars
+        self.max_hedges = max_hedges
+        self.max_queue_wait = max_queue_wait
+        self.max_domains = max_domains
+        # Relative cost of a fetch; Selenium-rendered pages cost a browser and ~5s.
+        self.expensive_domains = expensive_domains if expensive_domains is not None else {"facebook.com": 4.0}
+        self._stats: "OrderedDict[str, DomainStats]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def domain(url: str) -> str:
+        netloc = urlparse(url).netloc.lower()
+        return netloc[4:] if netloc.startswith("www.") else netloc
+
+    def _get(self, domain: str) -> DomainStats:
+        with self._lock:
+            stats = self._stats.get(domain)
+            if stats is None:
+                stats = self._stats[domain] = DomainStats()
+                while len(self._stats) > self.max_domains:
+                    self._stats.popitem(last=False)
+            else:
+                self._stats.move_to_end(domain)
+            return stats
+
+    def _cost(self, domain: str) -> float:
+        for suffix, cost in self.expensive_domains.items():
+            if domain == suffix or domain.endswith("." + suffix):
+                return cost
+        return 1.0
+
+    def allow(self, domain: str) -> bool:
+        """False while the domain's circuit is open; half-open probes are let through after cooldown."""
+        return self._get(domain).open_until <= time.time()
+
+    def timeout_for(self, domain: str) -> float:
+        stats = self._get(domain)
+        base = self.default_timeout if stats.latency is None else stats.latency * 3
+        cost = self._cost(domain)
+        return min(max(base, self.min_timeout * cost), self.max_timeout * cost)
+
+    def expected_latency(self, domain: str) -> float:
+        stats = self._get(domain)
+        return stats.latency if stats.latency is not None else self.default_timeout / 2
+
+    def record_fetch(self, domain: str, latency: t.Optional[float], ok: bool):
+        """latency is None when the fetch did not run its own work (it shared another caller's)."""
+        stats = self._get(domain)
+        with self._lock:
+            stats.attempts += 1
+            stats.failure_rate += self.alpha * ((0.0 if ok else 1.0) - stats.failure_rate)
+            if ok and latency is not None:
+                stats.latency = latency if stats.latency is None else stats.latency + self.alpha * (latency - stats.latency)
+            if ok:
+                stats.consecutive_failures = 0
+                stats.open_until = 0.0
+            else:
+                stats.consecutive_failures += 1
+                if stats.consecutive_failures >= self.failure_threshold:
+                    stats.open_until = time.time() + self.cooldown
+        metrics.inc("retrieval_fetches_total", help="Page fetches by outcome.", outcome="ok" if ok else "failed")
+
+    def record_abandoned(self, domain: str, elapsed: float):
+        """A fetch cancelled after elapsed seconds: elapsed is a lower bound on its latency.
+
+        It is neither a success nor a failure, so the circuit breaker is untouched.
+        """
+        stats = self._get(domain)
+        with self._lock:
+            stats.attempts += 1
+            if stats.latency is None or elapsed > stats.latency:
+                stats.latency = elapsed if stats.latency is None else stats.latency + self.alpha * (elapsed - stats.latency)
+        metrics.inc("retrieval_fetches_total", help="Page fetches by outcome.", outcome="abandoned")
+
+    def record_usefulness(self, domain: str, useful: bool):
+        stats = self._get(domain)
+        with self._lock:
+            stats.usefulness += self.alpha * ((1.0 if useful else 0.0) - stats.usefulness)
+
+    def plan(self, candidates: t.List[dict]) -> t.List[str]:
+        """Returns candidate URLs best-first, without duplicates or open-circuit domains."""
+        ranked, seen = [], set()
+        for position, item in enumerate(candidates):
+            url = item["url"]
+            domain = self.domain(url)
+            if url in seen or not self.allow(domain):
+                continue
+            seen.add(url)
+            stats = self._get(domain)
+            latency = self.expected_latency(domain)
+            value = item.get("score", 0.5) * (0.5 + stats.usefulness) * (1.0 - 0.8 * stats.failure_rate)
+            cost = self._cost(domain) * (1.0 + latency / self.default_timeout)
+            ranked.append((-value / cost, position, url))
+        ranked.sort()
+        return [url for _, _, url in ranked]
+
+    @staticmethod
+    def is_transport_failure(content: t.Optional[str]) -> bool:
+        return content is None or content.startswith(ERROR_PREFIXES)
+
+    def is_useful(self, content: t.Optional[str]) -> bool:
+        return not self.is_transport_failure(content) and len(content) >= self.min_chars
+
+    async def gather(
+        self,
+        candidates: t.List[dict],
+        fetch: t.Callable[[str, Deadline], t.Awaitable[str]],
+        max_chars: int = CONTEXT_MAX_CHARS,
+        parallelism: int = FETCH_PARALLELISM,
+    ) -> t.List[str]:
+        """Fetches planned URLs until max_chars of useful text is collected.
+
+        fetch(url, deadline) enforces deadline itself (see Deadline).
+        Returns the page texts in plan order, trimmed to max_chars in total.
+        """
+        queue = self.plan(candidates)
+        pending: t.Dict[asyncio.Task, tuple] = {}
+        fetched: t.List[tuple] = []
+        collected, hedges, launched = 0, 0, 0
+
+        def launch():
+            nonlocal launched
+            rank, launched = launched, launched + 1
+            url = queue.pop(0)
+            domain = self.domain(url)
+            deadline = Deadline(self.timeout_for(domain))
+            task = asyncio.ensure_future(fetch(url, deadline))
+            give_up = time.perf_counter() + deadline.timeout + self.max_queue_wait
+            pending[task] = (rank, url, domain, deadline, give_up)
+
+        def abandon(task):
+            _, _, domain, deadline, _ = pending.pop(task)
+            task.cancel()
+            if deadline.started is None:
+                # Never got a worker: says nothing about the domain.
+                return
+            # Left behind because faster pages filled the context: remember that it is slow,
+            # otherwise it stays at the top of the ranking and is paid for on every request.
+            self.record_abandoned(domain, time.perf_counter() - deadline.started)
+            self.record_usefulness(domain, False)
+
+        while queue and len(pending) < parallelism:
+            launch()
+
+        while pending:
+            now = time.perf_counter()
+            wait = min(give_up for *_, give_up in pending.values()) - now
+            can_hedge = queue and hedges < self.max_hedges
+            if can_hedge:
+                hedge_at = now + max(self.expected_latency(d) for _, _, d, _, _ in pending.values()) * 1.5
+                wait = min(wait, hedge_at - now)
+            done, _ = await asyncio.wait(pending, timeout=max(wait, 0.0), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                now = time.perf_counter()
+                for task in [task for task, (*_, give_up) in pending.items() if give_up <= now]:
+                    abandon(task)
+                if can_hedge and hedge_at <= now:
+                    hedges += 1
+                    launch()
+            for task in done:
+                rank, url, domain, deadline, _ = pending.pop(task)
+                try:
+                    content = task.result()
+                except (Rejected, asyncio.CancelledError):
+                    # Shed by our own stage budget or cancelled: says nothing about the domain.
+                    continue
+                except asyncio.TimeoutError:
+                    if deadline.started is None:
+                        # Shared another caller's fetch, which records the timeout itself.
+                        continue
+                    content = None
+                except Exception:
+                    content = None
+                latency = None if deadline.started is None else time.perf_counter() - deadline.started
+                # Only transport failures (exception, timeout, error text) count towards
+                # the circuit breaker; a short or empty page is a healthy but useless fetch.
+                self.record_fetch(domain, latency, not self.is_transport_failure(content))
+                if self.is_useful(content):
+                    fetched.append((rank, url, domain, content))
+                    collected += len(content)
+                else:
+                    self.record_usefulness(domain, False)
+            if collected >= max_chars:
+                break
+            while queue and len(pending) < parallelism:
+                launch()
+
+        for task in list(pending):
+            abandon(task)
+        metrics.inc("retrieval_hedges_total", hedges, help="Speculative fetches started for slow pages.")
+
+        contents, remaining = [], max_chars
+        for _, url, domain, content in sorted(fetched, key=lambda item: item[0]):
+            useful = remaining > 0
+            self.record_usefulness(domain, useful)
+            if useful:
+                contents.append(content[:remaining])
+                remaining -= len(contents[-1])
+        return contents
+
+    def stats(self) -> t.Dict[str, dict]:
+        with self._lock:
+            return {domain: stats.as_dict() for domain, stats in self._stats.items()}
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import typing as t
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent identical calls into one in-flight execution.
+
+    Callers passing the same key while a call is running wait for that call
+    and receive its result (or its exception) instead of starting their own.
+    Nothing is cached once the call finishes.
+    """
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: t.Dict[t.Hashable, _Call] = {}
+        self._async_calls: t.Dict[t.Hashable, asyncio.Future] = {}
+        self.requests = 0
+        self.executions = 0
+
+    def do(self, key: t.Hashable, fn: t.Callable, *args, **kwargs):
+        """Runs fn(*args, **kwargs) once for all concurrent callers of key."""
+        with self._lock:
+            self.requests += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    async def ado(self, key: t.Hashable, fn: t.Callable[..., t.Awaitable], *args, **kwargs):
+        """Async variant of do(): awaits fn(*args, **kwargs) once per key.
+
+        The shared call runs as its own task, so a caller that is cancelled or
+        times out stops waiting without cancelling the call for the others.
+        """
+        with self._lock:
+            self.requests += 1
+            task = self._async_calls.get(key)
+            if task is None:
+                task = self._async_calls[key] = asyncio.ensure_future(fn(*args, **kwargs))
+                task.add_done_callback(lambda done, key=key: self._forget(key, done))
+                self.executions += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: t.Hashable, task: asyncio.Future):
+        with self._lock:
+            self._async_calls.pop(key, None)
+        # Mark the exception as retrieved in case every caller stopped waiting.
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> t.Dict[str, t.Union[int, float]]:
+        """Returns request/execution counters and the dedup ratio (shared / requests)."""
+        with self._lock:
+            requests, executions = self.requests, self.executions
+        shared = requests - executions
+        return {
+            "requests": requests,
+            "executions": executions,
+            "shared": shared,
+            "dedup_ratio": shared / requests if requests else 0.0,
+        }
+
+
+_registry: t.Dict[str, SingleFlight] = {}
+_registry_lock = threading.Lock()
+
+
+def get_flight(name: str) -> SingleFlight:
+    """Returns the process-wide SingleFlight group registered under name."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = SingleFlight(name)
+        return _registry[name]
+
+
+def all_stats() -> t.Dict[str, t.Dict[str, t.Union[int, float]]]:
+    """Returns stats() for every registered group."""
+    with _registry_lock:
+        flights = list(_registry.values())
+    return {flight.name: flight.stats() for flight in flights}
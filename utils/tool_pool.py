@@ -0,0 +1,136 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+import typing as t
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from langchain_core.tools import BaseTool, StructuredTool
+
+from utils.lazy import Lazy
+from utils.tracing import metrics, span
+
+TOOL_POOL_WORKERS = int(os.getenv("TOOL_POOL_WORKERS", "8"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "60"))
+# Tool calls of one LLM turn that ToolNode runs at the same time.
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+# Timed-out calls still running in the pool before it is replaced by a fresh one.
+TOOL_POOL_MAX_STUCK = int(os.getenv("TOOL_POOL_MAX_STUCK", str(max(TOOL_POOL_WORKERS // 2, 1))))
+
+# Shared by every agent in the process, so concurrent agent steps cannot
+# oversubscribe the machine (or vnstock / the sites being scraped).
+pool = Lazy(lambda: ThreadPoolExecutor(TOOL_POOL_WORKERS, thread_name_prefix="tool"), "tool_pool", warm=False)
+
+##### STUCK CALLS #####
+# A Python thread cannot be stopped: a tool call that times out keeps its worker
+# until the underlying call returns, so tools should bound their own I/O
+# (requests timeouts, Selenium page-load timeouts). Calls that don't are counted
+# here, and once TOOL_POOL_MAX_STUCK of them hold workers the pool is swapped for
+# a fresh one. The old threads are not killed: they exit when their call returns,
+# so up to TOOL_POOL_MAX_STUCK threads per replacement can linger meanwhile.
+# Reentrant: add_done_callback runs _unstuck at once if the call has just finished.
+_pool_lock = threading.RLock()
+_stuck: t.Set[Future] = set()
+
+
+def _submit(fn, *args) -> t.Tuple[ThreadPoolExecutor, Future]:
+    with _pool_lock:
+        executor = pool.get()
+        return executor, executor.submit(fn, *args)
+
+
+def _abandon(executor: ThreadPoolExecutor, future: Future):
+    """Gives up on a timed-out call; replaces the pool when too many calls are stuck in it."""
+    if future.cancel():
+        return  # still queued: it never took a worker
+    with _pool_lock:
+        if executor is not pool.get() or future.done():
+            return
+        _stuck.add(future)
+        future.add_done_callback(_unstuck)
+        if len(_stuck) < TOOL_POOL_MAX_STUCK:
+            return
+        _stuck.clear()
+        pool.reset()
+    executor.shutdown(wait=False)
+    metrics.inc("tool_pool_replacements_total", help="Tool pools replaced because timed-out calls held their workers.")
+
+
+def _unstuck(future: Future):
+    with _pool_lock:
+        _stuck.discard(future)
+
+
+def _timed_out(name: str, timeout: float) -> str:
+    metrics.inc("tool_timeouts_total", help="Tool calls abandoned after their timeout.", tool=name)
+    return f"Error: {name} timed out after {timeout:g}s"
+
+
+def _observe(name: str, start: float):
+    metrics.observe("tool_seconds", time.perf_counter() - start, help="Tool call latency.", tool=name)
+
+
+def bounded_tool(tool: BaseTool, timeout: float = TOOL_TIMEOUT) -> StructuredTool:
+    """The same tool, executed on the shared pool with a timeout.
+
+    On timeout the agent gets an error string back (like the tools' own
+    "Error: ..." results) and the call is left to finish in the background
+    (see STUCK CALLS). Native coroutines (tool.coroutine) run on the event loop instead.
+    """
+    name = tool.name
+
+    def run_traced(kwargs):
+        start = time.perf_counter()
+        try:
+            with span(f"tool.{name}"):
+                return tool.func(**kwargs)
+        finally:
+            _observe(name, start)
+
+    def run(**kwargs):
+        # Carry the trace and LangChain callback context into the worker thread.
+        executor, future = _submit(contextvars.copy_context().run, run_traced, kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            _abandon(executor, future)
+            return _timed_out(name, timeout)
+
+    async def arun(**kwargs):
+        start = time.perf_counter()
+        try:
+            if tool.coroutine is not None:
+                with span(f"tool.{name}"):
+                    return await asyncio.wait_for(tool.coroutine(**kwargs), timeout)
+            executor, future = _submit(contextvars.copy_context().run, run_traced, kwargs)
+            try:
+                return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                _abandon(executor, future)
+                raise
+        except asyncio.TimeoutError:
+            return _timed_out(name, timeout)
+        finally:
+            if tool.coroutine is not None:
+                _observe(name, start)
+
+    return StructuredTool(
+        name=name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        func=run,
+        coroutine=arun,
+        return_direct=tool.return_direct,
+    )
+
+
+def bounded_tools(tools: t.Iterable[BaseTool], timeouts: t.Optional[t.Dict[str, float]] = None) -> t.List[StructuredTool]:
+    """bounded_tool() for each tool; timeouts overrides TOOL_TIMEOUT per tool name."""
+    timeouts = timeouts or {}
+    return [bounded_tool(tool, timeouts.get(tool.name, TOOL_TIMEOUT)) for tool in tools]
+
+
+def tool_config(max_concurrency: int = TOOL_MAX_CONCURRENCY) -> dict:
+    """Runnable config for agent.invoke(); ToolNode sizes its per-step executor from max_concurrency."""
+    return {"max_concurrency": max_concurrency}
@@ -0,0 +1,242 @@
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import typing as t
+import uuid
+from collections import deque
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+from utils.singleflight import all_stats as singleflight_stats
+
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "2000"))
+OTEL_ENABLED = otel_trace is not None and os.getenv("OTEL_ENABLED", "0") == "1"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_trace_id: contextvars.ContextVar[t.Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+_parent_span: contextvars.ContextVar[t.Optional[str]] = contextvars.ContextVar("parent_span", default=None)
+_export: contextvars.ContextVar[bool] = contextvars.ContextVar("trace_export", default=True)
+
+
+############## METRICS ##############
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRegistry:
+    """Minimal in-process counters and histograms rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: t.Dict[str, t.Dict[tuple, float]] = {}
+        self._histograms: t.Dict[str, t.Dict[tuple, _Histogram]] = {}
+        self._help: t.Dict[str, str] = {}
+
+    def inc(self, name: str, value: float = 1, help: str = "", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            if help:
+                self._help.setdefault(name, help)
+
+    def observe(self, name: str, value: float, help: str = "", buckets=DEFAULT_BUCKETS, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = _Histogram(buckets)
+            series[key].observe(value)
+            if help:
+                self._help.setdefault(name, help)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in self._counters.items():
+                lines += self._header(name, "counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_labels(key)} {value}")
+            for name, series in self._histograms.items():
+                lines += self._header(name, "histogram")
+                for key, hist in series.items():
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        lines.append(f"{name}_bucket{_labels(key + (('le', str(bound)),))} {count}")
+                    lines.append(f"{name}_bucket{_labels(key + (('le', '+Inf'),))} {hist.count}")
+                    lines.append(f"{name}_sum{_labels(key)} {hist.sum}")
+                    lines.append(f"{name}_count{_labels(key)} {hist.count}")
+        return "\n".join(lines)
+
+    def _header(self, name, kind):
+        header = [f"# TYPE {name} {kind}"]
+        if name in self._help:
+            header.insert(0, f"# HELP {name} {self._help[name]}")
+        return header
+
+
+def _labels(key: tuple) -> str:
+    if not key:
+        return ""
+    pairs = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in key)
+    return "{" + pairs + "}"
+
+
+metrics = MetricsRegistry()
+
+
+def render_prometheus() -> str:
+    """Renders all registered metrics plus single-flight stats for a /metrics endpoint."""
+    lines = [metrics.render()]
+    flights = singleflight_stats()
+    if flights:
+        lines.append("# TYPE singleflight_requests_total counter")
+        lines += [f'singleflight_requests_total{{group="{g}"}} {s["requests"]}' for g, s in flights.items()]
+        lines.append("# TYPE singleflight_executions_total counter")
+        lines += [f'singleflight_executions_total{{group="{g}"}} {s["executions"]}' for g, s in flights.items()]
+        lines.append("# TYPE singleflight_dedup_ratio gauge")
+        lines += [f'singleflight_dedup_ratio{{group="{g}"}} {s["dedup_ratio"]}' for g, s in flights.items()]
+    return "\n".join(lines) + "\n"
+
+
+############## TRACING ##############
+
+_spans: t.Deque[dict] = deque(maxlen=TRACE_BUFFER_SIZE)
+_export_lock = threading.Lock()
+_otel_tracer = otel_trace.get_tracer("soni_agent") if OTEL_ENABLED else None
+
+
+def start_trace(trace_id: t.Optional[str] = None, export: bool = True) -> str:
+    """Starts a new trace for the current context (one per request) and returns its id.
+
+    With export=False the spans only go to the in-memory buffer, e.g. in a pool
+    worker whose spans the parent process re-records under its own trace.
+    """
+    trace_id = trace_id or uuid.uuid4().hex
+    _trace_id.set(trace_id)
+    _parent_span.set(None)
+    _export.set(export)
+    return trace_id
+
+
+def current_trace_id() -> t.Optional[str]:
+    return _trace_id.get()
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs):
+    """Times a stage and records it as a span and in stage_duration_seconds{stage=name}.
+
+    The yielded dict can be used to attach attributes discovered while the stage runs.
+    """
+    span_id = uuid.uuid4().hex[:16]
+    parent_id = _parent_span.get()
+    parent_token = _parent_span.set(span_id)
+    otel_cm = _otel_tracer.start_as_current_span(name) if _otel_tracer else contextlib.nullcontext()
+    start_wall = time.time()
+    start = time.perf_counter()
+    error = None
+    with otel_cm as otel_span:
+        try:
+            yield attrs
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            _parent_span.reset(parent_token)
+            record_stage(name, duration, start=start_wall, error=error, span_id=span_id, parent_id=parent_id, **attrs)
+            if otel_span is not None:
+                for key, value in attrs.items():
+                    if isinstance(value, (str, bool, int, float)):
+                        otel_span.set_attribute(key, value)
+
+
+def record_stage(name: str, duration: float, start: t.Optional[float] = None, error: t.Optional[str] = None,
+                 span_id: t.Optional[str] = None, parent_id: t.Optional[str] = None, **attrs):
+    """Records an already measured stage, e.g. one spanning the yields of a streaming generator."""
+    metrics.observe("stage_duration_seconds", duration, help="Duration of request stages.", stage=name)
+    if error:
+        metrics.inc("stage_errors_total", help="Stages that raised.", stage=name)
+    record = {
+        "trace_id": _trace_id.get(),
+        "span_id": span_id or uuid.uuid4().hex[:16],
+        "parent_id": parent_id if span_id else _parent_span.get(),
+        "name": name,
+        "start": start if start is not None else time.time() - duration,
+        "duration": duration,
+        "attrs": attrs,
+    }
+    if error:
+        record["error"] = error
+    _record_span(record)
+
+
+def timed(name: str):
+    """Decorator form of span() for sync and async functions."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _record_span(record: dict):
+    _spans.append(record)
+    if TRACE_EXPORT_PATH and _export.get():
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with _export_lock, open(TRACE_EXPORT_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def recent_spans(trace_id: t.Optional[str] = None) -> t.List[dict]:
+    spans = list(_spans)
+    if trace_id:
+        spans = [s for s in spans if s["trace_id"] == trace_id]
+    return spans
+
+
+def chrome_trace(trace_id: t.Optional[str] = None) -> dict:
+    """Returns recent spans as Chrome trace events, loadable in chrome://tracing or Perfetto."""
+    events = []
+    for s in recent_spans(trace_id):
+        events.append({
+            "name": s["name"],
+            "ph": "X",
+            "ts": s["start"] * 1e6,
+            "dur": s["duration"] * 1e6,
+            "pid": 1,
+            "tid": s["trace_id"] or "untraced",
+            "args": {k: v for k, v in s["attrs"].items() if isinstance(v, (str, bool, int, float))},
+        })
+    return {"traceEvents": events}